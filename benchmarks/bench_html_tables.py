@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+发布页表格解析基准：pd.read_html 与 html_tables.extract_tables 对比
+
+用法：
+    python benchmarks/bench_html_tables.py [release1.html release2.html ...] [--repeat 20]
+
+未指定文件时生成一个与国家统计局发布页表格结构相同的合成页面，另有两个变体在数据表格前
+多一个 read_html 不计入的表格（纯图片的版式表格、display:none 的表格）。
+两种方式的解析结果会先做一致性校验，再分别计时。
+"""
+
+import os
+import sys
+import io
+import time
+import random
+import argparse
+import statistics
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from config import CITY_ADCODE
+from html_tables import extract_tables
+from update_price import process_tables
+
+
+def _table_html(rows):
+    body = ''.join('<tr>' + ''.join(f'<td>{c}</td>' for c in row) + '</tr>' for row in rows)
+    return f'<table border="1">{body}</table>'
+
+
+# 排在数据表格之前、read_html 不计入的表格：纯图片的版式表格、隐藏的表格
+LAYOUT_TABLES = {
+    'synthetic+image-table': '<table><tr><td><img src="banner.png"></td></tr></table>',
+    'synthetic+hidden-table': '<table style="display: none"><tr><td>打印版</td></tr></table>',
+}
+
+
+def make_release_page(seed=0, filler_paragraphs=200, prefix=''):
+    rng = random.Random(seed)
+    cities = list(CITY_ADCODE)
+
+    def value():
+        return f'{100 + rng.uniform(-3, 3):.1f}'
+
+    tables = []
+    for _ in range(2):
+        rows = [['城市', '环比', '同比', '定基比', '城市', '环比', '同比', '定基比'],
+                ['', '上月=100', '上年同月=100', '2020年=100', '', '上月=100', '上年同月=100', '2020年=100']]
+        rows += [[cities[i]] + [value() for _ in range(3)] + [cities[35 + i]] + [value() for _ in range(3)]
+                 for i in range(35)]
+        tables.append(_table_html(rows))
+    for _ in range(4):
+        rows = [['城市', '90m2及以下', '', '', '90-144m2', '', '', '144m2以上', '', '']] * 3
+        rows += [[cities[i]] + [value() for _ in range(9)] for i in range(70)]
+        tables.append(_table_html(rows))
+    filler = ''.join(f'<p>{"国家统计局城市司首席统计师解读 " * 10}</p>' for _ in range(filler_paragraphs))
+    return f'<html><head><meta charset="utf-8"></head><body>{prefix}{filler}{"".join(tables)}{filler}</body></html>'
+
+
+def parse_with_read_html(html):
+    return process_tables(pd.read_html(io.StringIO(html)))
+
+
+def parse_with_extractor(html):
+    return process_tables(extract_tables(html))
+
+
+def _normalize(parsed):
+    def to_float(v):
+        try:
+            return round(float(v), 4)
+        except (TypeError, ValueError):
+            return None
+
+    def walk(obj):
+        if isinstance(obj, dict):
+            return {k: walk(v) for k, v in obj.items()}
+        return to_float(obj)
+
+    return [walk(part) for part in parsed]
+
+
+def time_it(func, html, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark release page table parsing')
+    parser.add_argument('pages', nargs='*', help='Saved release page HTML files')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append((os.path.basename(path), f.read()))
+    else:
+        pages = [('synthetic', make_release_page())]
+        pages += [(name, make_release_page(prefix=table)) for name, table in LAYOUT_TABLES.items()]
+
+    print(f"{'page':<28}{'read_html(ms)':>15}{'extractor(ms)':>15}{'speedup':>10}")
+    for name, html in pages:
+        if _normalize(parse_with_read_html(html)) != _normalize(parse_with_extractor(html)):
+            print(f"WARNING: {name}: parsed values differ between read_html and extractor")
+        baseline = time_it(parse_with_read_html, html, args.repeat)
+        candidate = time_it(parse_with_extractor, html, args.repeat)
+        print(f"{name:<28}{baseline * 1000:>15.2f}{candidate * 1000:>15.2f}{baseline / candidate:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+规模基准：用合成数据对各脚本的主要路径计时，并与基线结果比较
+
+用法：
+    python benchmarks/bench_scale.py [--preset small|medium|large] [--cities N --years N]
+                                     [--repeat 3] [--output results.json]
+                                     [--baseline baseline.json] [--threshold 1.25]
+
+在临时目录中生成指定规模的 CSV（见 synthetic_data.py），缓存目录通过 CITYPRICE_CACHE_DIR
+指向同一临时目录，不影响 data/ 下的数据与缓存。计时项目：
+
+    load_data（冷/热缓存）、extract_by_month、extract_by_city、validate_csv、
+    calculate_yearly_avg（冷/热）、图表渲染（line 4 城、overlay 全部城市）、update_csv（新增一个月）
+
+每项重复 --repeat 次，记录最小值与中位数。结果写为 JSON；指定 --baseline 时逐项比较最小值
+（受系统负载影响最小），超过基线 × threshold（且绝对差超过 NOISE_FLOOR 秒）记为回归，退出码为 1。
+
+价格立方体、年度汇总、排名与校验中的逐城市检查只包含 70 个真实城市，超出的合成城市只参与
+加载、筛选导出、校验的逐行检查与入库。年度汇总与图表渲染的耗时不随 --cities 增长，
+输出与结果 JSON 中标为 "70 cities"（scales_with_cities = false）。
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'scripts'))
+
+PRESETS = {'small': (70, 20), 'medium': (1000, 50), 'large': (10000, 100)}
+RESULTS_VERSION = 1
+# 差值低于该秒数时不判定为回归（计时噪声）
+NOISE_FLOOR = 0.005
+CHART_CITIES = ['北京', '上海', '广州', '深圳']
+# 只处理 70 个真实城市（价格立方体 / 年度汇总）的项目，耗时不随 --cities 增长
+FIXED_CITY_CASES = {'calculate_yearly_avg.cold', 'calculate_yearly_avg.warm', 'render_chart.line', 'render_chart.overlay'}
+
+
+def time_case(func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    return {'min': min(samples), 'median': statistics.median(samples), 'repeat': repeat}
+
+
+def run_cases(workdir, n_cities, n_years, repeat, jobs=1):
+    # 缓存目录必须在导入脚本模块之前设置
+    os.environ['CITYPRICE_CACHE_DIR'] = os.path.join(workdir, '.cache')
+    os.environ['CITYPRICE_NO_DAEMON'] = '1'
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+
+    import numpy as np
+    import pandas as pd
+    import data_store
+    from data_store import load_data, cache_dir_for, month_from_key
+    import aggregates
+    from synthetic_data import generate
+    from export_stream import RowFilter, export_rows
+    from extract_price import extract_by_month, extract_by_city
+    from validata_price import validate_csv
+    from update_price import update_csv
+    from yearly_trend import calculate_yearly_avg
+    from generate_chart import render_chart
+    from price_cube import load_cube
+    from render_cache import RenderCache
+    from vintage_store import ensure_base
+
+    csv_path = os.path.join(workdir, '70cityprice.csv')
+    start = time.perf_counter()
+    rows, next_month = generate(csv_path, n_cities, n_years)
+    meta = {'cities': n_cities, 'years': n_years, 'rows': rows, 'csv_bytes': os.path.getsize(csv_path),
+            'generate_seconds': round(time.perf_counter() - start, 3)}
+    print(f"Generated {rows} records ({n_cities} cities x {n_years} years, "
+          f"{meta['csv_bytes'] / 1e6:.1f} MB) in {meta['generate_seconds']:.1f}s")
+    if n_cities > 70:
+        print(f"NOTE: Cube, aggregates and charts cover the 70 real cities only; cases marked [70 cities] "
+              f"do not scale with --cities")
+
+    def clear_frame_cache():
+        shutil.rmtree(cache_dir_for(csv_path), ignore_errors=True)
+        data_store._LOADED.clear()
+
+    def clear_aggregates():
+        shutil.rmtree(cache_dir_for(csv_path, 'aggregates'), ignore_errors=True)
+        aggregates._LOADED.clear()
+
+    results = {}
+
+    def run(name, func, setup=None, times=repeat):
+        results[name] = time_case(func, times, setup)
+        results[name]['scales_with_cities'] = name not in FIXED_CITY_CASES
+        note = '  [70 cities]' if name in FIXED_CITY_CASES and n_cities != 70 else ''
+        print(f"  {name:<32}{results[name]['median']:>10.3f}s  (min {results[name]['min']:.3f}s){note}")
+
+    run('load_data.cold', lambda: load_data(csv_path), setup=clear_frame_cache)
+    run('load_data.warm', lambda: load_data(csv_path), setup=data_store._LOADED.clear)
+
+    df = data_store.read_typed(csv_path)
+    months = df[data_store.MONTH_COLUMN].to_numpy()
+    last_year, _ = month_from_key(int(months.max()))
+    out_path = os.path.join(workdir, 'extract.csv')
+    run('extract_by_month', lambda: export_rows(
+        df, extract_by_month(RowFilter(), last_year - 4, 1, last_year, 12), out_path))
+    run('extract_by_city', lambda: export_rows(df, extract_by_city(RowFilter(), CHART_CITIES), out_path))
+    run('validate_csv', lambda: validate_csv(csv_path, jobs=jobs))
+
+    first_year = last_year - n_years + 1
+    run('calculate_yearly_avg.cold', lambda: calculate_yearly_avg(CHART_CITIES, first_year, last_year, '同比',
+                                                                  csv_path=csv_path), setup=clear_aggregates)
+    run('calculate_yearly_avg.warm', lambda: calculate_yearly_avg(CHART_CITIES, first_year, last_year, '同比',
+                                                                  csv_path=csv_path), setup=aggregates._LOADED.clear)
+
+    cube = load_cube(csv_path)
+    cache = RenderCache(cache_dir=os.path.join(workdir, 'render'), reuse=False)
+    run('render_chart.line', lambda: render_chart(cube.frame(CHART_CITIES, '同比', 'CommodityHouseIDX'),
+                                                   CHART_CITIES, '同比', 'line',
+                                                   os.path.join(workdir, 'line.png'), cache=cache))
+    run('render_chart.overlay', lambda: render_chart(cube.frame(cube.cities, '同比', 'CommodityHouseIDX'),
+                                                      cube.cities, '同比', 'overlay',
+                                                      os.path.join(workdir, 'overlay.png'), cache=cache))
+
+    # 更新放在最后：首次调用会把 CSV 拆分为月度分区、保存基础版本快照，并按分区重建一次加载缓存（不计时）
+    with redirect_stdout(io.StringIO()):
+        update_csv(csv_path, [])
+        ensure_base(csv_path)
+        data_store.read_typed(csv_path)
+    records = next_month.to_numpy().tolist()
+    run('update_csv', lambda: update_csv(csv_path, records, validate=n_cities == 70))
+
+    meta['versions'] = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__}
+    meta['platform'] = platform.platform()
+    meta['timestamp'] = datetime.now().isoformat(timespec='seconds')
+    return {'version': RESULTS_VERSION, 'meta': meta, 'results': results}
+
+
+def compare(current, baseline, threshold):
+    # 返回回归项目列表
+    base_meta, meta = baseline.get('meta', {}), current['meta']
+    if (base_meta.get('cities'), base_meta.get('years')) != (meta['cities'], meta['years']):
+        print(f"WARNING: Baseline scale {base_meta.get('cities')}x{base_meta.get('years')} "
+              f"differs from {meta['cities']}x{meta['years']}")
+    regressions = []
+    print(f"\n{'case':<32}{'baseline':>10}{'current':>10}{'ratio':>8}")
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f"{name:<32}{'-':>10}{result['min']:>10.3f}{'new':>8}")
+            continue
+        ratio = result['min'] / base['min'] if base['min'] > 0 else float('inf')
+        regressed = ratio > threshold and result['min'] - base['min'] > NOISE_FLOOR
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<32}{base['min']:>10.3f}{result['min']:>10.3f}{ratio:>7.2f}x{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scale benchmark on synthetic data')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--cities', type=int, help='Override preset city count')
+    parser.add_argument('--years', type=int, help='Override preset year count')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='validate_csv worker processes')
+    parser.add_argument('--workdir', help='Directory for generated data (default: temporary, removed afterwards)')
+    parser.add_argument('--output', '-o', default='bench_scale_results.json', help='Results JSON')
+    parser.add_argument('--baseline', help='Baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Regression ratio (default: 1.25)')
+    args = parser.parse_args()
+
+    n_cities, n_years = PRESETS[args.preset]
+    n_cities, n_years = args.cities or n_cities, args.years or n_years
+    workdir = args.workdir or tempfile.mkdtemp(prefix='cityprice-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        current = run_cases(workdir, n_cities, n_years, args.repeat, args.jobs)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, ensure_ascii=False, indent=2)
+    print(f"[OK] Results saved to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"[FAIL] {len(regressions)} regression(s) over {args.threshold:.2f}x: {', '.join(regressions)}")
+            return 1
+        print(f"[PASS] No regression over {args.threshold:.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
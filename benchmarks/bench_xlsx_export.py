@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Excel 导出基准：DataFrame.to_excel 与 export_stream.XlsxWriter（openpyxl 只写模式）对比
+
+用法：
+    python benchmarks/bench_xlsx_export.py [--cities 70 --years 20] [--csv data/70cityprice.csv]
+                                          [--start 201601 --end 202512] [--repeat 3]
+
+默认在临时目录生成合成数据（见 synthetic_data.py），--csv 时使用已有的数据文件。
+to_excel 为原来的写法：合并全部筛选结果后一次写出，工作簿的单元格对象全部留在内存中。
+流式写出另测按城市、按指数类型分工作表（一遍写出）的情形。
+先读回两种方式写出的数值核对一致，再分别计时；每种方式另用 tracemalloc 单独运行一次记录 Python 内存峰值。
+"""
+
+import os
+import sys
+import io
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'scripts'))
+
+
+def export_with_to_excel(df, row_filter, path):
+    import pandas as pd
+    from data_store import to_export_frame
+    to_export_frame(pd.concat(list(row_filter.iter_chunks(df)))).to_excel(path, index=False)
+
+
+def time_it(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def peak_memory_mb(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def check_same(baseline_path, streamed_path, split_path):
+    import pandas as pd
+    expected = pd.read_excel(baseline_path)
+    streamed = pd.read_excel(streamed_path)
+    if not expected.equals(streamed):
+        print("WARNING: to_excel and streamed workbooks differ")
+    sheets = pd.read_excel(split_path, sheet_name=None)
+    if sum(len(s) for s in sheets.values()) != len(expected):
+        print("WARNING: per-city sheets do not add up to the full extract")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark xlsx export: to_excel vs streamed write-only')
+    parser.add_argument('--csv', help='Existing 70cityprice.csv (default: generate synthetic data)')
+    parser.add_argument('--cities', type=int, default=70, help='Synthetic city count')
+    parser.add_argument('--years', type=int, default=20, help='Synthetic year count')
+    parser.add_argument('--start', help='First month YYYYMM (default: all)')
+    parser.add_argument('--end', help='Last month YYYYMM (default: all)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cityprice-xlsx-')
+    # 缓存目录必须在导入脚本模块之前设置
+    os.environ['CITYPRICE_CACHE_DIR'] = os.path.join(workdir, '.cache')
+    os.environ['CITYPRICE_NO_DAEMON'] = '1'
+    from data_store import load_data, month_key
+    from export_stream import RowFilter, export_rows
+    from extract_price import parse_month_arg
+    from synthetic_data import generate
+
+    try:
+        csv_path = args.csv
+        if not csv_path:
+            csv_path = os.path.join(workdir, '70cityprice.csv')
+            generate(csv_path, args.cities, args.years, holdout=False)
+        with redirect_stdout(io.StringIO()):
+            df = load_data(csv_path)
+
+        def row_filter():
+            f = RowFilter()
+            if args.start or args.end:
+                f.months(month_key(*parse_month_arg(args.start)) if args.start else None,
+                         month_key(*parse_month_arg(args.end)) if args.end else None)
+            return f
+
+        rows = sum(len(c) for c in row_filter().iter_chunks(df))
+        print(f"Exporting {rows} records from {csv_path if args.csv else 'synthetic data'}")
+
+        paths = {name: os.path.join(workdir, f'{name}.xlsx') for name in ('to_excel', 'stream', 'city', 'fixedbase')}
+        cases = [
+            ('to_excel', lambda: export_with_to_excel(df, row_filter(), paths['to_excel'])),
+            ('stream', lambda: export_rows(df, row_filter(), paths['stream'])),
+            ('stream --split-by city', lambda: export_rows(df, row_filter(), paths['city'], split_by='city')),
+            ('stream --split-by fixedbase',
+             lambda: export_rows(df, row_filter(), paths['fixedbase'], split_by='fixedbase')),
+        ]
+        for _, func in cases[:3]:
+            func()
+        check_same(paths['to_excel'], paths['stream'], paths['city'])
+
+        print(f"\n{'case':<30}{'time(s)':>10}{'peak(MB)':>10}{'speedup':>10}")
+        baseline = None
+        for name, func in cases:
+            seconds = time_it(func, args.repeat)
+            peak = peak_memory_mb(func)
+            baseline = baseline or seconds
+            print(f"{name:<30}{seconds:>10.2f}{peak:>10.1f}{baseline / seconds:>9.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 年度/季度汇总表
+
+按 城市 × 年份（季度）× 指数类型 × 指数列 预先计算月度值的 均值/最小值/最大值/期末值，
+由价格立方体整块计算，保存为 data/.cache/aggregates-*/year.npy、quarter.npy。
+update_price 新增月份时只重算该月所在的年份与季度；yearly_trend 直接读取汇总表，
+查询只涉及 城市数 × 年数 个值。
+"""
+
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CSV_PATH, normalize_city_name
+from data_store import (cache_dir_for, source_stat, source_matches, source_fingerprint, file_sha256,
+                        write_json_atomic, save_array_atomic)
+from price_cube import load_cube
+from profiling import span
+
+AGGREGATES_VERSION = 1
+STATS = ('mean', 'min', 'max', 'last')
+# 每个汇总周期包含的月数
+PERIODS = {'year': 12, 'quarter': 3}
+
+_LOADED = {}
+
+
+def period_key(month_key, period):
+    return int(month_key) // PERIODS[period]
+
+
+def period_label(key, period):
+    if period == 'year':
+        return str(key)
+    return f'{key // 4}Q{key % 4 + 1}'
+
+
+def aggregate_months(values, start_key, period):
+    # values: [城市 × 月份 × 指数类型 × 指数列]，返回 [城市 × 周期 × 指数类型 × 指数列 × 统计量]
+    size = PERIODS[period]
+    n_months = values.shape[1]
+    first = start_key // size
+    count = (start_key + n_months - 1) // size - first + 1
+    offset = start_key - first * size
+    padded = np.full((values.shape[0], count * size) + values.shape[2:], np.nan, dtype=np.float64)
+    padded[:, offset:offset + n_months] = values
+    blocks = padded.reshape((values.shape[0], count, size) + values.shape[2:])
+
+    valid = ~np.isnan(blocks)
+    counts = valid.sum(axis=2)
+    out = np.full(counts.shape + (len(STATS),), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out[..., 0] = np.where(counts > 0, np.nansum(blocks, axis=2) / counts, np.nan)
+    out[..., 1] = np.fmin.reduce(blocks, axis=2)
+    out[..., 2] = np.fmax.reduce(blocks, axis=2)
+    last = size - 1 - np.argmax(valid[:, :, ::-1], axis=2)
+    out[..., 3] = np.where(counts > 0, np.take_along_axis(blocks, last[:, :, None], axis=2)[:, :, 0], np.nan)
+    return first, out
+
+
+class Aggregates:
+    def __init__(self, tables, firsts, cities, fixedbases, columns):
+        self.tables = tables
+        self.firsts = firsts
+        self.cities = list(cities)
+        self.fixedbases = list(fixedbases)
+        self.columns = list(columns)
+        self._city_index = {c: i for i, c in enumerate(self.cities)}
+
+    def frame(self, cities, fixedbase, column, period='year', stat='mean', start=None, end=None):
+        # start/end 为周期键：年份，或 年份*4 + 季度序号(0-3)
+        table, first = self.tables[period], self.firsts[period]
+        lo = 0 if start is None else min(max(start - first, 0), table.shape[1])
+        hi = table.shape[1] if end is None else min(max(end - first + 1, 0), table.shape[1])
+        rows = [self._city_index[normalize_city_name(c)] for c in cities]
+        values = table[rows, lo:max(lo, hi), self.fixedbases.index(fixedbase), self.columns.index(column),
+                       STATS.index(stat)]
+        index = pd.Index(first + np.arange(lo, max(lo, hi)), name=period.upper())
+        return pd.DataFrame(values.T, index=index, columns=list(cities))
+
+
+def _aggregate_paths(csv_path):
+    agg_dir = cache_dir_for(csv_path, 'aggregates')
+    return agg_dir, {p: os.path.join(agg_dir, f'{p}.npy') for p in PERIODS}, os.path.join(agg_dir, 'labels.json')
+
+
+def _read_labels(labels_path):
+    try:
+        with open(labels_path, encoding='utf-8') as f:
+            labels = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return labels if labels.get('version') == AGGREGATES_VERSION else None
+
+
+def _cube_values(cube):
+    return np.asarray(cube.values[:, :cube.n_months], dtype=np.float64)
+
+
+def build_aggregates(cube):
+    values = _cube_values(cube)
+    tables, firsts = {}, {}
+    for period in PERIODS:
+        firsts[period], tables[period] = aggregate_months(values, cube.start_key, period)
+    return Aggregates(tables, firsts, cube.cities, cube.fixedbases, cube.columns)
+
+
+def save_aggregates(aggregates, csv_path=CSV_PATH, source=None):
+    agg_dir, table_paths, labels_path = _aggregate_paths(csv_path)
+    os.makedirs(agg_dir, exist_ok=True)
+    for period, path in table_paths.items():
+        save_array_atomic(path, aggregates.tables[period])
+    write_json_atomic(labels_path, {'version': AGGREGATES_VERSION, 'source': source, 'firsts': aggregates.firsts,
+                                    'cities': aggregates.cities, 'fixedbases': aggregates.fixedbases,
+                                    'columns': aggregates.columns})
+
+
+def load_aggregates(csv_path=CSV_PATH):
+    source = source_stat(csv_path)
+    loaded = _LOADED.get(csv_path)
+    if loaded is not None and loaded[0] == source_fingerprint(source):
+        return loaded[1]
+    with span('load_aggregates'):
+        aggregates = _load_aggregates_cached(csv_path, source)
+    _LOADED[csv_path] = (source_fingerprint(source), aggregates)
+    return aggregates
+
+
+def _load_aggregates_cached(csv_path, source):
+    _, table_paths, labels_path = _aggregate_paths(csv_path)
+    labels = _read_labels(labels_path)
+    if labels is not None and source_matches(labels.get('source'), csv_path, source):
+        try:
+            tables = {p: np.load(path, mmap_mode='r') for p, path in table_paths.items()}
+            return Aggregates(tables, labels['firsts'], labels['cities'], labels['fixedbases'], labels['columns'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    aggregates = build_aggregates(load_cube(csv_path))
+    source['sha256'] = file_sha256(source['path'])
+    try:
+        save_aggregates(aggregates, csv_path, source)
+    except OSError as e:
+        print(f"WARNING: Cannot write aggregates: {e}")
+    return aggregates
+
+
+def update_aggregates(month_keys, previous_source, csv_path=CSV_PATH):
+    # 只重算新增月份所在的年份/季度；返回 False 表示汇总表会在下次 load_aggregates 时整体重建
+    agg_dir, table_paths, labels_path = _aggregate_paths(csv_path)
+    labels = _read_labels(labels_path)
+    if labels is None or not source_matches(labels.get('source'), csv_path, previous_source):
+        return False
+    cube = load_cube(csv_path)
+    if cube.cities != labels['cities'] or cube.fixedbases != labels['fixedbases'] or cube.columns != labels['columns']:
+        return False
+
+    for period, size in PERIODS.items():
+        table = np.load(table_paths[period], mmap_mode='r+')
+        first = labels['firsts'][period]
+        keys = sorted({period_key(k, period) for k in month_keys if k >= 0})
+        if any(not 0 <= key - first < table.shape[1] for key in keys):
+            # 新的年份/季度超出现有表格，整表重算（表格很小）
+            del table
+            labels['firsts'][period], table = aggregate_months(_cube_values(cube), cube.start_key, period)
+            save_array_atomic(table_paths[period], table)
+            continue
+        for key in keys:
+            lo = max(key * size, cube.start_key) - cube.start_key
+            hi = min((key + 1) * size, cube.start_key + cube.n_months) - cube.start_key
+            values = np.asarray(cube.values[:, lo:hi], dtype=np.float64)
+            _, block = aggregate_months(values, cube.start_key + lo, period)
+            table[:, key - first] = block[:, 0]
+        table.flush()
+        del table
+
+    labels['source'] = source_stat(csv_path)
+    labels['source']['sha256'] = file_sha256(labels['source']['path'])
+    write_json_atomic(labels_path, labels)
+    return True
+
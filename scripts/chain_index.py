@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 环比链接指数
+
+环比（上月 = 100）沿月份轴连乘得到各城市各指数列的累计水平序列，一次对整个价格立方体
+[城市 × 月份 × 指数列] 计算。在此基础上可换算到任意基期月份（= 100）、由环比推算同比，
+并列出推算同比与公布同比不一致的记录。计算结果按数据版本缓存在 data/.cache/ 下。
+
+缺失的环比月份按持平处理以便后续月份继续链接，该月的水平值本身记为 NaN；
+推算同比要求窗口内 12 个月的环比齐全。
+"""
+
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CSV_PATH, OUTPUT_DIR, IDX_COLUMNS, normalize_city_name
+from data_store import (month_key, month_from_key, cache_dir_for, source_stat, source_matches, source_fingerprint,
+                        write_json_atomic, save_array_atomic)
+from price_cube import load_cube
+
+CHAIN_VERSION = 1
+# 推算同比与公布同比的允许偏差（指数点），公布值保留一位小数且样本有调整
+YOY_TOLERANCE = 1.5
+
+_LOADED = {}
+
+
+def _log_factors(mom):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        factors = np.asarray(mom, dtype=np.float64) / 100.0
+        return np.where(factors > 0, np.log(factors), np.nan)
+
+
+def chain_levels(mom, axis=0):
+    # 累计水平：首月之前 = 1.0
+    logs = np.moveaxis(_log_factors(mom), axis, 0)
+    valid = ~np.isnan(logs)
+    levels = np.where(valid, np.exp(np.cumsum(np.where(valid, logs, 0.0), axis=0)), np.nan)
+    return np.moveaxis(levels, 0, axis)
+
+
+def implied_yoy(mom, axis=0, window=12):
+    logs = np.moveaxis(_log_factors(mom), axis, 0)
+    valid = ~np.isnan(logs)
+    pad = np.zeros((1,) + logs.shape[1:])
+    sums = np.concatenate([pad, np.cumsum(np.where(valid, logs, 0.0), axis=0)])
+    counts = np.concatenate([pad, np.cumsum(valid, axis=0)])
+    yoy = np.full(logs.shape, np.nan)
+    complete = counts[window:] - counts[:-window] == window
+    yoy[window - 1:] = np.where(complete, 100.0 * np.exp(sums[window:] - sums[:-window]), np.nan)
+    return np.moveaxis(yoy, 0, axis)
+
+
+class ChainIndex:
+    def __init__(self, levels, yoy, reported_yoy, start_key, cities, columns):
+        self.levels = levels
+        self.yoy = yoy
+        self.reported_yoy = reported_yoy
+        self.start_key = int(start_key)
+        self.cities = list(cities)
+        self.columns = list(columns)
+        self._city_index = {c: i for i, c in enumerate(self.cities)}
+        self._col_index = {c: i for i, c in enumerate(self.columns)}
+
+    @property
+    def n_months(self):
+        return self.levels.shape[1]
+
+    def rebase(self, base_key=None):
+        # 返回 [城市 × 月份 × 指数列]，基期月份 = 100；未指定基期时以首月之前 = 100
+        if base_key is None:
+            return self.levels * 100.0
+        idx = int(base_key) - self.start_key
+        if not 0 <= idx < self.n_months:
+            year, month = month_from_key(int(base_key))
+            raise KeyError(f"Base month out of range: {year}/{month}")
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.levels / self.levels[:, idx:idx + 1] * 100.0
+
+    def _frame(self, values, cities, column, start_key=None, end_key=None):
+        lo = 0 if start_key is None else min(max(start_key - self.start_key, 0), self.n_months)
+        hi = self.n_months if end_key is None else min(max(end_key - self.start_key + 1, 0), self.n_months)
+        rows = [self._city_index[c] for c in cities]
+        matrix = values[rows, lo:max(lo, hi), self._col_index[column]]
+        index = pd.Index(self.start_key + np.arange(lo, max(lo, hi)), name='MONTH')
+        return pd.DataFrame(matrix.T, index=index, columns=cities)
+
+    def level_frame(self, cities, column, base_key=None, start_key=None, end_key=None):
+        return self._frame(self.rebase(base_key), cities, column, start_key, end_key)
+
+    def yoy_frame(self, cities, column, start_key=None, end_key=None):
+        return self._frame(self.yoy, cities, column, start_key, end_key)
+
+    def inconsistencies(self, tolerance=YOY_TOLERANCE):
+        with np.errstate(invalid='ignore'):
+            diff = self.reported_yoy - self.yoy
+            bad = np.abs(diff) > tolerance
+        c, t, j = np.nonzero(bad)
+        dates = [f"{y}/{m}/1" for y, m in map(month_from_key, self.start_key + t)]
+        return pd.DataFrame({
+            'DATE': dates,
+            'CITY': np.array(self.cities, dtype=object)[c],
+            'Column': np.array(self.columns, dtype=object)[j],
+            'ReportedYoY': self.reported_yoy[c, t, j].round(1),
+            'ImpliedYoY': self.yoy[c, t, j].round(2),
+            'Diff': diff[c, t, j].round(2),
+        })
+
+
+def build_chain(cube):
+    values = np.asarray(cube.values[:, :cube.n_months], dtype=np.float64)
+    mom = values[:, :, cube.fixedbases.index('环比')]
+    reported = values[:, :, cube.fixedbases.index('同比')]
+    return ChainIndex(chain_levels(mom, axis=1), implied_yoy(mom, axis=1), reported,
+                      cube.start_key, cube.cities, cube.columns)
+
+
+def _chain_paths(csv_path):
+    chain_dir = cache_dir_for(csv_path, 'chain')
+    return (chain_dir, os.path.join(chain_dir, 'levels.npy'), os.path.join(chain_dir, 'yoy.npy'),
+            os.path.join(chain_dir, 'labels.json'))
+
+
+def load_chain(csv_path=CSV_PATH):
+    source = source_stat(csv_path)
+    loaded = _LOADED.get(csv_path)
+    if loaded is not None and loaded[0] == source_fingerprint(source):
+        return loaded[1]
+    chain = _load_chain_cached(csv_path, source)
+    _LOADED[csv_path] = (source_fingerprint(source), chain)
+    return chain
+
+
+def _load_chain_cached(csv_path, source):
+    cube = load_cube(csv_path)
+    reported = np.asarray(cube.values[:, :cube.n_months, cube.fixedbases.index('同比')], dtype=np.float64)
+    chain_dir, levels_path, yoy_path, labels_path = _chain_paths(csv_path)
+    try:
+        with open(labels_path, encoding='utf-8') as f:
+            labels = json.load(f)
+        if labels.get('version') == CHAIN_VERSION and labels.get('start_key') == cube.start_key \
+                and source_matches(labels.get('source'), csv_path, source):
+            levels, yoy = np.load(levels_path), np.load(yoy_path)
+            if levels.shape == reported.shape:
+                return ChainIndex(levels, yoy, reported, cube.start_key, cube.cities, cube.columns)
+    except (OSError, ValueError):
+        pass
+
+    chain = build_chain(cube)
+    try:
+        os.makedirs(chain_dir, exist_ok=True)
+        save_array_atomic(levels_path, chain.levels)
+        save_array_atomic(yoy_path, chain.yoy)
+        write_json_atomic(labels_path, {'version': CHAIN_VERSION, 'start_key': chain.start_key,
+                                        'n_months': chain.n_months, 'source': source})
+    except OSError as e:
+        print(f"WARNING: Cannot write chain index cache: {e}")
+    return chain
+
+
+def parse_month(text):
+    text = text.replace('-', '').replace('/', '')
+    return month_key(int(text[:4]), int(text[4:6]))
+
+
+def _export(frame, output):
+    out = frame.copy()
+    out.index = [f"{y}/{m}/1" for y, m in map(month_from_key, out.index)]
+    out.index.name = 'DATE'
+    path = output if os.path.dirname(output) else os.path.join(OUTPUT_DIR, output)
+    out.round(3).to_csv(path)
+    print(f"[OK] Saved to: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='70 City House Price Chain-Linked Index')
+    subparsers = parser.add_subparsers(dest='command')
+    for name, help_text in (('levels', 'Chain-linked level series from 环比'), ('yoy', 'YoY implied by 环比')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('cities', nargs='+')
+        sub.add_argument('--column', '-c', default='CommodityHouseIDX', choices=IDX_COLUMNS)
+        sub.add_argument('--start', help='Start month YYYYMM')
+        sub.add_argument('--end', help='End month YYYYMM')
+        sub.add_argument('--output', '-o', help='Output CSV (default: print)')
+        if name == 'levels':
+            sub.add_argument('--base', help='Base month YYYYMM (= 100)')
+    check_parser = subparsers.add_parser('check', help='Report 同比 that disagree with compounded 环比')
+    check_parser.add_argument('--tolerance', type=float, default=YOY_TOLERANCE)
+    check_parser.add_argument('--output', '-o', help='Write all inconsistencies to CSV')
+    args = parser.parse_args()
+
+    if args.command is None:
+        parser.print_help()
+        return 0
+
+    chain = load_chain(CSV_PATH)
+    if args.command == 'check':
+        report = chain.inconsistencies(args.tolerance)
+        print(f"Inconsistent 同比/环比: {len(report)} of {int(np.isfinite(chain.yoy).sum())} comparable values")
+        if len(report):
+            print(report.head(20).to_string(index=False))
+            if args.output:
+                path = args.output if os.path.dirname(args.output) else os.path.join(OUTPUT_DIR, args.output)
+                report.to_csv(path, index=False)
+                print(f"[OK] Saved to: {path}")
+        return 0
+
+    cities = [normalize_city_name(c) for c in args.cities]
+    unknown = [c for c, n in zip(args.cities, cities) if n not in chain.cities]
+    if unknown:
+        print(f"ERROR: City not found: {', '.join(unknown)}")
+        return 1
+    start_key = parse_month(args.start) if args.start else None
+    end_key = parse_month(args.end) if args.end else None
+    if args.command == 'levels':
+        try:
+            frame = chain.level_frame(cities, args.column, parse_month(args.base) if args.base else None,
+                                      start_key, end_key)
+        except KeyError as e:
+            print(f"ERROR: {e.args[0]}")
+            return 1
+    else:
+        frame = chain.yoy_frame(cities, args.column, start_key, end_key)
+    if args.output:
+        _export(frame, args.output)
+    else:
+        frame.index = [f"{y}-{m:02d}" for y, m in map(month_from_key, frame.index)]
+        print(frame.round(2).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,13 +4,21 @@
 """
 
 import os
-import pandas as pd
+from functools import lru_cache
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 REPO_ROOT = os.path.dirname(SCRIPT_DIR)
-DATA_DIR = os.path.join(REPO_ROOT, 'data')
+# 可用环境变量指定数据目录与缓存目录（例如测试、基准测试使用临时目录）
+DATA_DIR = os.environ.get('CITYPRICE_DATA_DIR') or os.path.join(REPO_ROOT, 'data')
 OUTPUT_DIR = os.path.join(DATA_DIR, 'outputs')
 CSV_PATH = os.path.join(DATA_DIR, '70cityprice.csv')
+CACHE_DIR = os.environ.get('CITYPRICE_CACHE_DIR') or os.path.join(DATA_DIR, '.cache')
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, 'http')
+DAEMON_SOCKET = os.path.join(CACHE_DIR, 'daemon.sock')
+DAEMON_PORT = 47070
+RENDER_CACHE_DIR = os.path.join(CACHE_DIR, 'render')
+RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+CHART_CONFIG_PATH = os.path.join(REPO_ROOT, 'assets', 'chart_config.yaml')
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -42,6 +50,8 @@ CITY_NAME_ALIASES = {
 
 CITY_STANDARD_NAME = {city: city for city in CITY_ADCODE}
 
+CITY_CODE = {city: i for i, city in enumerate(CITY_ADCODE)}
+
 REQUIRED_COLUMNS = [
     'DATE', 'ADCODE', 'CITY', 'FixedBase', 'HouseIDX', 'ResidentIDX',
     'CommodityHouseIDX', 'SecondHandIDX', 'ResidentBelow90IDX',
@@ -50,13 +60,18 @@ REQUIRED_COLUMNS = [
     'SecondHandAbove144IDX'
 ]
 
+IDX_COLUMNS = [c for c in REQUIRED_COLUMNS if c.endswith('IDX')]
+
 ALLOWED_FIXED_BASE = {'同比', '环比', '定基比'}
 REQUIRED_FIXED_BASE = {'同比', '环比'}
 
 EXPECTED_CITY_COUNT = len(CITY_ADCODE)
 
 
+@lru_cache(maxsize=1024)
 def normalize_city_name(name):
+    # pandas 延迟导入：守护进程客户端只加载本模块的常量，不应为此付出 pandas 的导入开销
+    import pandas as pd
     if pd.isna(name):
         return None
     name = str(name).replace(' ', '').replace('\u3000', '').strip()
@@ -67,6 +82,11 @@ def normalize_city_name(name):
     return name if name else None
 
 
+@lru_cache(maxsize=1024)
+def resolve_city_code(name):
+    return CITY_CODE.get(normalize_city_name(name), -1)
+
+
 def get_city_adcode(city_name):
     normalized = normalize_city_name(city_name)
     if normalized and normalized in CITY_ADCODE:
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 查询守护进程客户端
+
+命令行脚本启动时先尝试把参数转发给常驻的 price_daemon（数据已在内存中），
+守护进程未运行（连接或发送请求失败）时直接返回，由脚本在本进程内照常执行；
+请求已发出后等待结果超时或连接中断则报错退出，不再在本进程重复执行同一查询。本模块只依赖标准库。
+"""
+
+import os
+import sys
+import json
+import socket
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from profiling import requested as profiling_requested
+from config import DAEMON_SOCKET, DAEMON_PORT
+
+NO_DAEMON_ENV = 'CITYPRICE_NO_DAEMON'
+CONNECT_TIMEOUT = 0.2
+# 等待守护进程返回结果的上限（包括数据变化后的重新加载与图表渲染）
+READ_TIMEOUT = 300
+
+
+# 请求未能完整发出，守护进程不会执行它
+class RequestNotSent(ConnectionError):
+    pass
+
+
+def connect(timeout=CONNECT_TIMEOUT):
+    if hasattr(socket, 'AF_UNIX'):
+        if not os.path.exists(DAEMON_SOCKET):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = DAEMON_SOCKET
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = ('127.0.0.1', DAEMON_PORT)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def send_request(sock, request, timeout=READ_TIMEOUT):
+    payload = json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n'
+    with sock:
+        sock.settimeout(timeout)
+        try:
+            sock.sendall(payload)
+        except OSError as e:
+            raise RequestNotSent(str(e)) from e
+        with sock.makefile('rb') as stream:
+            line = stream.readline()
+    if not line:
+        raise ConnectionError("Daemon closed the connection")
+    return json.loads(line.decode('utf-8'))
+
+
+def forward_to_daemon(script, argv=None):
+    if os.environ.get(NO_DAEMON_ENV):
+        return
+    argv = sys.argv[1:] if argv is None else argv
+    if '-' in argv or profiling_requested(argv):
+        # 数据写到标准输出时在本进程执行：守护进程返回的输出混有进度信息；剖析也只对本进程有意义
+        return
+    sock = connect()
+    if sock is None:
+        return
+    request = {'script': script, 'argv': argv, 'cwd': os.getcwd()}
+    try:
+        response = send_request(sock, request)
+    except RequestNotSent:
+        return
+    except (OSError, ValueError) as e:
+        # 请求已交给守护进程，可能仍在执行；在本进程重跑会把同一查询执行两次
+        print(f"ERROR: No response from query daemon: {e or type(e).__name__}")
+        print(f"Run `python scripts/price_daemon.py status` to check it, or set {NO_DAEMON_ENV}=1 to run locally")
+        sys.exit(1)
+    sys.stdout.write(response.get('output', ''))
+    sys.stdout.flush()
+    sys.exit(response.get('exit_code', 0))
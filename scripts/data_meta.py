@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 数据元信息清单
+
+数据更新后在数据文件旁写入 70cityprice.meta.json，记录城市列表、月份范围与月数、
+各指数类型的行数以及数据源的大小/修改时间/校验和。list-cities / list-dates 直接读取该清单，
+不导入 pandas；清单缺失或与数据源不一致时由调用方完整加载数据并重写清单。
+本模块只依赖标准库，清单内容由 data_store.write_metadata 生成。
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CSV_PATH
+
+META_VERSION = 1
+
+
+def meta_path_for(csv_path=CSV_PATH):
+    return os.path.splitext(os.path.abspath(csv_path))[0] + '.meta.json'
+
+
+def read_metadata(csv_path=CSV_PATH):
+    try:
+        with open(meta_path_for(csv_path), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == META_VERSION else None
+
+
+def metadata_is_current(meta):
+    source = meta.get('source') or {}
+    try:
+        st = os.stat(source['path'])
+    except (OSError, KeyError):
+        return False
+    return st.st_size == source.get('size') and st.st_mtime_ns == source.get('mtime_ns')
+
+
+def load_metadata(csv_path=CSV_PATH):
+    meta = read_metadata(csv_path)
+    return meta if meta is not None and metadata_is_current(meta) else None
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 数据加载模块
+
+CSV 只解析一次：DATE/CITY/FixedBase 转为分类编码，ADCODE 转为 int32，
+各 *IDX 列转为 float32（空值为 NaN），并增加 int16 月份序号列 MONTH（year*12+month-1）
+与 int16 城市编码列 CITY_CODE（每个不同城市名只标准化一次；70 城用固定编码，
+不在城市表中的城市按名称排序编码在其后），
+数据按 MONTH 排序，月份范围查询用 searchsorted 切片完成。
+解析结果以 .npy 边车缓存保存在 data/.cache 下（按数据源大小/修改时间/哈希校验），
+后续运行直接内存映射读取，无需再解析文本。
+存在按月分区（partition_store）时以分区清单为数据源，缓存只重新解析变化的分区。
+"""
+
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CSV_PATH, CACHE_DIR, IDX_COLUMNS, CITY_CODE, normalize_city_name
+from data_meta import META_VERSION, meta_path_for, read_metadata
+from profiling import span
+
+CACHE_VERSION = 6
+CATEGORY_COLUMNS = ['DATE', 'CITY', 'FixedBase']
+MONTH_COLUMN = 'MONTH'
+CITY_CODE_COLUMN = 'CITY_CODE'
+INTERNAL_COLUMNS = [MONTH_COLUMN, CITY_CODE_COLUMN]
+INVALID_MONTH = -1
+# MONTH 列为 int16，可表示到 2730 年
+MAX_MONTH_KEY = np.iinfo(np.int16).max
+
+# 进程内已加载的数据，按数据源的路径/大小/修改时间复用（常驻进程中免去重复读取）
+_LOADED = {}
+
+
+def month_key(year, month):
+    return year * 12 + month - 1
+
+
+def month_from_key(key):
+    year, month = divmod(int(key), 12)
+    return year, month + 1
+
+
+def month_to_datetime64(keys):
+    # datetime64[M] 以 1970-01 为 0，与月份序号只差一个常数
+    return (np.asarray(keys, dtype=np.int64) - 1970 * 12).astype('datetime64[M]')
+
+
+def date_to_month_key(date_str):
+    try:
+        parts = str(date_str).split('/')
+        year, month = int(parts[0]), int(parts[1])
+    except (ValueError, IndexError):
+        return INVALID_MONTH
+    if not 1 <= month <= 12 or not 0 <= month_key(year, month) <= MAX_MONTH_KEY:
+        return INVALID_MONTH
+    return month_key(year, month)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_city_series(series):
+    codes, uniques = pd.factorize(series)
+    names = np.array([normalize_city_name(u) for u in uniques] + [None], dtype=object)
+    return pd.Series(names[codes], index=series.index, name=series.name)
+
+
+def city_code_table(series):
+    # 标准化城市名 -> 编码。编码由该列的全部城市名（分类列取 categories）决定，
+    # 同一份数据的筛选结果与 CITY_CODE 列一致
+    names = series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype) else pd.unique(series.dropna())
+    normalized = {normalize_city_name(n) for n in names}
+    table = {n: CITY_CODE[n] for n in normalized if n in CITY_CODE}
+    extra = sorted(n for n in normalized if n not in CITY_CODE)
+    table.update((n, len(CITY_CODE) + i) for i, n in enumerate(extra))
+    return table
+
+
+def city_code_series(series):
+    codes, uniques = pd.factorize(series)
+    table = city_code_table(series)
+    lookup = np.array([table[normalize_city_name(u)] for u in uniques] + [-1], dtype=np.int16)
+    return lookup[codes]
+
+
+def resolve_city_codes(cities, city_series=None):
+    # 不传 city_series 时只能解析 70 城；传入数据的 CITY 列时其他城市按该数据的编码解析
+    table = CITY_CODE if city_series is None else city_code_table(city_series)
+    return sorted({table.get(normalize_city_name(c), -1) for c in cities} - {-1})
+
+
+def filter_cities(df, cities):
+    return df[df[CITY_CODE_COLUMN].isin(resolve_city_codes(cities, df['CITY']))]
+
+
+def source_path(csv_path=CSV_PATH):
+    from partition_store import manifest_path_for
+    manifest_path = manifest_path_for(csv_path)
+    return manifest_path if os.path.exists(manifest_path) else csv_path
+
+
+def read_raw_csv(csv_path=CSV_PATH):
+    from partition_store import read_manifest, read_partitions
+    manifest = read_manifest(csv_path)
+    if manifest is not None:
+        return read_partitions(csv_path, manifest=manifest)
+    return pd.read_csv(csv_path, dtype=str)
+
+
+def convert_frame(df):
+    df = df.drop(columns=INTERNAL_COLUMNS, errors='ignore')
+    for col in df.columns:
+        if col in IDX_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+        elif col == 'ADCODE':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int32')
+        elif not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    if 'DATE' in df.columns:
+        dates = df['DATE'].cat.categories
+        keys = np.array([date_to_month_key(d) for d in dates], dtype=np.int32)
+        order = np.argsort(keys, kind='stable')
+        df['DATE'] = df['DATE'].cat.reorder_categories(dates[order], ordered=True)
+        codes = df['DATE'].cat.codes.to_numpy()
+        df[MONTH_COLUMN] = np.where(codes >= 0, keys[order][codes], INVALID_MONTH).astype(np.int16)
+    if 'CITY' in df.columns:
+        df[CITY_CODE_COLUMN] = city_code_series(df['CITY'])
+    return df
+
+
+def memory_report(raw, typed):
+    # 每列内存占用（deep，含字符串对象本身）：原始文本表 vs 加载器转换后的定型表
+    raw_bytes = raw.memory_usage(deep=True, index=False)
+    typed_bytes = typed.memory_usage(deep=True, index=False)
+    columns = list(raw.columns) + [c for c in typed.columns if c not in raw.columns]
+    return pd.DataFrame({
+        'column': columns,
+        'raw_dtype': [str(raw[c].dtype) if c in raw.columns else '-' for c in columns],
+        'raw_bytes': [int(raw_bytes.get(c, 0)) for c in columns],
+        'typed_dtype': [str(typed[c].dtype) if c in typed.columns else '-' for c in columns],
+        'typed_bytes': [int(typed_bytes.get(c, 0)) for c in columns],
+    })
+
+
+def sort_by_month(df):
+    if MONTH_COLUMN not in df.columns:
+        return df
+    order = np.argsort(df[MONTH_COLUMN].to_numpy(), kind='stable')
+    return df.iloc[order].reset_index(drop=True)
+
+
+def month_bounds(months, start_key=None, end_key=None):
+    # 月份已排序时返回 [lo, hi) 行区间，未排序返回 None
+    if len(months) > 1 and not (months[1:] >= months[:-1]).all():
+        return None
+    # 无效日期 (-1) 排在最前，范围查询一律排除
+    lo = int(np.searchsorted(months, max(start_key if start_key is not None else 0, 0), side='left'))
+    hi = len(months) if end_key is None else int(np.searchsorted(months, end_key, side='right'))
+    return lo, max(lo, hi)
+
+
+def month_slice(df, start_key=None, end_key=None):
+    if start_key is None and end_key is None:
+        return df
+    months = df[MONTH_COLUMN].to_numpy()
+    bounds = month_bounds(months, start_key, end_key)
+    if bounds is None:
+        mask = months != INVALID_MONTH
+        if start_key is not None:
+            mask &= months >= start_key
+        if end_key is not None:
+            mask &= months <= end_key
+        return df[mask]
+    return df.iloc[bounds[0]:bounds[1]]
+
+
+def parse_csv(csv_path=CSV_PATH):
+    header = pd.read_csv(csv_path, nrows=0).columns
+    dtypes = {col: ('category' if col in CATEGORY_COLUMNS else str) for col in header}
+    return sort_by_month(convert_frame(pd.read_csv(csv_path, dtype=dtypes)))
+
+
+def parse_source(csv_path=CSV_PATH, cached_df=None, cached_parts=None):
+    from partition_store import read_manifest, read_partitions, partition_key
+    manifest = read_manifest(csv_path)
+    if manifest is None:
+        return parse_csv(csv_path), None
+
+    parts = {name: entry['sha256'] for name, entry in manifest['partitions'].items()}
+    if cached_df is None or cached_parts is None:
+        return sort_by_month(convert_frame(read_partitions(csv_path, manifest=manifest))), parts
+
+    stale = {n for n in set(parts) | set(cached_parts) if parts.get(n) != cached_parts.get(n)}
+    changed = [n for n in stale if n in parts]
+    kept = cached_df[~cached_df[MONTH_COLUMN].isin([partition_key(n) for n in stale])]
+    fresh = convert_frame(read_partitions(csv_path, names=changed, manifest=manifest))
+    return sort_by_month(convert_frame(pd.concat([kept, fresh], ignore_index=True))), parts
+
+
+def to_export_frame(df):
+    out = df.drop(columns=INTERNAL_COLUMNS, errors='ignore')
+    for col in IDX_COLUMNS:
+        if col in out.columns and out[col].dtype == np.float32:
+            # float32 的最短十进制表示即原始文本值，转回 float64 以免导出 104.19999694824219
+            out[col] = out[col].to_numpy().astype(str).astype(np.float64)
+    return out
+
+
+def cache_dir_for(csv_path, kind='frame'):
+    tag = hashlib.sha1(os.path.abspath(csv_path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f'{kind}-{tag}')
+
+
+def source_stat(csv_path=CSV_PATH):
+    path = source_path(csv_path)
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def source_matches(cached, csv_path=CSV_PATH, current=None):
+    current = current or source_stat(csv_path)
+    if not cached or cached.get('path') != current['path'] or cached.get('size') != current['size']:
+        return False
+    if cached.get('mtime_ns') == current['mtime_ns']:
+        return True
+    return cached.get('sha256') is not None and cached.get('sha256') == file_sha256(current['path'])
+
+
+def write_json_atomic(path, obj):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def save_array_atomic(path, values):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
+
+
+def _save_cache(cache_dir, df, source, parts=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        entry = {'name': col, 'file': f'col{i:02d}.npy'}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry.update(kind='category', ordered=bool(series.cat.ordered),
+                         categories=[str(c) for c in series.cat.categories])
+            values = series.cat.codes.to_numpy()
+        elif isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            entry.update(kind='nullable')
+            values = series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=-1)
+        else:
+            entry.update(kind='plain')
+            values = series.to_numpy()
+        save_array_atomic(os.path.join(cache_dir, entry['file']), values)
+        columns.append(entry)
+    meta = {'version': CACHE_VERSION, 'source': source, 'partitions': parts, 'rows': len(df), 'columns': columns}
+    write_json_atomic(os.path.join(cache_dir, 'meta.json'), meta)
+
+
+def _read_cache_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CACHE_VERSION else None
+
+
+def _load_cache(cache_dir, meta):
+    data = {}
+    for entry in meta['columns']:
+        values = np.load(os.path.join(cache_dir, entry['file']), mmap_mode='r')
+        if len(values) != meta['rows']:
+            return None
+        if entry['kind'] == 'category':
+            data[entry['name']] = pd.Categorical.from_codes(
+                values, categories=entry['categories'], ordered=entry['ordered'])
+        elif entry['kind'] == 'nullable':
+            values = np.array(values)
+            data[entry['name']] = pd.arrays.IntegerArray(values, values == -1)
+        else:
+            data[entry['name']] = values
+    return pd.DataFrame(data)
+
+
+def source_fingerprint(source):
+    return source['path'], source['size'], source['mtime_ns']
+
+
+def read_typed(csv_path=CSV_PATH, use_cache=True):
+    if not use_cache:
+        return parse_source(csv_path)[0]
+
+    source = source_stat(csv_path)
+    loaded = _LOADED.get(csv_path)
+    if loaded is not None and loaded[0] == source_fingerprint(source):
+        return loaded[1]
+    df = _read_typed_cached(csv_path, source)
+    meta = read_metadata(csv_path)
+    if meta is None or not source_matches(meta.get('source'), csv_path, source):
+        try:
+            write_metadata(csv_path, df, source)
+        except OSError as e:
+            print(f"WARNING: Cannot write data summary: {e}")
+    _LOADED[csv_path] = (source_fingerprint(source), df)
+    return df
+
+
+def _read_typed_cached(csv_path, source):
+    cache_dir = cache_dir_for(csv_path)
+    meta = _read_cache_meta(cache_dir)
+    if meta is not None and source_matches(meta.get('source'), csv_path, source):
+        try:
+            df = _load_cache(cache_dir, meta)
+        except (OSError, ValueError, KeyError):
+            df = None
+        if df is not None:
+            if meta['source'].get('mtime_ns') != source['mtime_ns']:
+                meta['source'].update(source)
+                try:
+                    write_json_atomic(os.path.join(cache_dir, 'meta.json'), meta)
+                except OSError:
+                    pass
+            return df
+
+    cached_df = None
+    if meta is not None and meta.get('partitions') is not None:
+        try:
+            cached_df = _load_cache(cache_dir, meta)
+        except (OSError, ValueError, KeyError):
+            cached_df = None
+    df, parts = parse_source(csv_path, cached_df, meta.get('partitions') if cached_df is not None else None)
+    source['sha256'] = file_sha256(source['path'])
+    try:
+        _save_cache(cache_dir, df, source, parts)
+    except OSError as e:
+        print(f"WARNING: Cannot write data cache: {e}")
+    return df
+
+
+def write_metadata(csv_path, df, source):
+    months = df.loc[df[MONTH_COLUMN] >= 0, MONTH_COLUMN]
+    first_month = month_from_key(int(months.min())) if len(months) else None
+    last_month = month_from_key(int(months.max())) if len(months) else None
+    source = dict(source)
+    if 'sha256' not in source:
+        source['sha256'] = file_sha256(source['path'])
+    meta = {
+        'version': META_VERSION,
+        'source': source,
+        'rows': len(df),
+        'rows_by_fixedbase': {str(k): int(v) for k, v in df['FixedBase'].value_counts(sort=False).items() if v},
+        'cities': sorted(str(c) for c in df['CITY'].dropna().unique()),
+        'first_month': first_month,
+        'last_month': last_month,
+        'month_count': int(months.nunique()),
+        'updated_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    write_json_atomic(meta_path_for(csv_path), meta)
+    return meta
+
+
+def load_data(csv_path=CSV_PATH, use_cache=True):
+    if not os.path.exists(source_path(csv_path)):
+        print(f"ERROR: CSV file not found: {csv_path}")
+        sys.exit(1)
+    print(f"Reading data file: {csv_path}")
+    with span('load_data') as sp:
+        df = read_typed(csv_path, use_cache=use_cache)
+        sp.record(rows=len(df))
+    print(f"Total records: {len(df)}")
+    return df
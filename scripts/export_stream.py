@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 流式导出
+
+月份范围、城市、指数类型三个筛选条件组合为一个惰性的 RowFilter：月份范围在已排序的数据上
+用 searchsorted 定出行区间，城市与指数类型在每个数据块上计算掩码。匹配的行按块依次交给写出器，
+不生成完整的筛选结果副本，峰值内存只与块大小有关。
+
+写出格式：CSV、JSON Lines、JSON（缩进的记录数组，值与 CSV 文本相同，均为字符串）、Parquet（需要 pyarrow）、
+Excel（openpyxl 只写模式，可按城市或指数类型分工作表），目标为 `-` 时写到标准输出。
+"""
+
+import io
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import IDX_COLUMNS
+from data_store import MONTH_COLUMN, CITY_CODE_COLUMN, INVALID_MONTH, month_bounds, resolve_city_codes, to_export_frame
+
+CHUNK_ROWS = 10000
+STDOUT = '-'
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'json', '.parquet': 'parquet',
+                     '.xlsx': 'xlsx'}
+# xlsx 分工作表的依据
+SPLIT_COLUMNS = {'city': 'CITY', 'fixedbase': 'FixedBase'}
+IDX_NUMBER_FORMAT = '0.0'
+
+
+class RowFilter:
+    def __init__(self):
+        self.start_key = None
+        self.end_key = None
+        self.city_names = None
+        self.city_codes = None
+        self.fixedbases = None
+
+    def months(self, start_key, end_key):
+        self.start_key, self.end_key = start_key, end_key
+        return self
+
+    def cities(self, cities):
+        # 城市名在筛选时按数据的 CITY 列解析，不在 70 城表中的城市也能选中
+        self.city_names = list(cities)
+        return self
+
+    def fixedbase(self, fixedbases):
+        self.fixedbases = sorted(fixedbases) if fixedbases else None
+        return self
+
+    def bounds(self, df):
+        if self.start_key is None and self.end_key is None:
+            return 0, len(df), False
+        bounds = month_bounds(df[MONTH_COLUMN].to_numpy(), self.start_key, self.end_key)
+        if bounds is None:
+            # 数据未按月份排序时，月份条件改在每个块的掩码中计算
+            return 0, len(df), True
+        return bounds[0], bounds[1], False
+
+    def mask(self, chunk, check_months=False):
+        mask = None
+        if check_months:
+            months = chunk[MONTH_COLUMN].to_numpy()
+            mask = months != INVALID_MONTH
+            if self.start_key is not None:
+                mask &= months >= self.start_key
+            if self.end_key is not None:
+                mask &= months <= self.end_key
+        if self.city_codes is not None:
+            city_mask = np.isin(chunk[CITY_CODE_COLUMN].to_numpy(), self.city_codes)
+            mask = city_mask if mask is None else mask & city_mask
+        if self.fixedbases is not None:
+            fb_mask = chunk['FixedBase'].isin(self.fixedbases).to_numpy()
+            mask = fb_mask if mask is None else mask & fb_mask
+        return mask
+
+    def iter_chunks(self, df, chunk_rows=CHUNK_ROWS):
+        if self.city_names is not None:
+            self.city_codes = resolve_city_codes(self.city_names, df['CITY'])
+        lo, hi, check_months = self.bounds(df)
+        for start in range(lo, hi, chunk_rows):
+            chunk = df.iloc[start:min(hi, start + chunk_rows)]
+            mask = self.mask(chunk, check_months)
+            if mask is not None:
+                chunk = chunk[mask]
+            if len(chunk):
+                yield chunk
+
+
+class _TextWriter:
+    def __init__(self, target, stdout=None):
+        self.stdout = stdout or sys.stdout
+        self.stream = self.stdout if target == STDOUT else open(target, 'w', encoding='utf-8', newline='')
+        self.rows = 0
+
+    def write(self, chunk):
+        self._write(to_export_frame(chunk))
+        self.rows += len(chunk)
+
+    def close(self):
+        if self.stream is self.stdout:
+            self.stream.flush()
+        else:
+            self.stream.close()
+
+
+class CsvWriter(_TextWriter):
+    def _write(self, frame):
+        frame.to_csv(self.stream, header=self.rows == 0, index=False, quoting=1, lineterminator='\n')
+
+
+class JsonLinesWriter(_TextWriter):
+    def _write(self, frame):
+        text = frame.to_json(orient='records', lines=True, force_ascii=False)
+        self.stream.write(text if text.endswith('\n') else text + '\n')
+
+
+class JsonArrayWriter(_TextWriter):
+    # 保持原来 pd.read_csv(dtype=str) + to_json(indent=2) 的格式：数值为 CSV 中的文本字符串，空值为 null
+    def _write(self, frame):
+        text = pd.read_csv(io.StringIO(frame.to_csv(index=False)), dtype=str)
+        records = text.to_json(orient='records', force_ascii=False, indent=2)[2:-2]
+        self.stream.write(('[\n' if self.rows == 0 else ',\n') + records)
+
+    def close(self):
+        self.stream.write('\n]' if self.rows else '[\n\n]')
+        super().close()
+
+
+class ParquetWriter:
+    def __init__(self, target, stdout=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.pa, self.pq = pa, pq
+        self.target = (stdout or sys.stdout).buffer if target == STDOUT else target
+        self.writer = None
+        self.rows = 0
+
+    def write(self, chunk):
+        table = self.pa.Table.from_pandas(to_export_frame(chunk), preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.target, table.schema)
+        self.writer.write_table(table)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class XlsxWriter:
+    # 只写模式下每行直接序列化到该工作表的临时文件，不建立整个工作簿的单元格对象；
+    # 分工作表时各行按 split_by 列的值写入对应工作表，一遍完成
+    def __init__(self, target, stdout=None, split_by=None):
+        try:
+            from openpyxl import Workbook
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.styles import Font
+            from openpyxl.utils import get_column_letter
+        except ImportError:
+            raise RuntimeError("Excel output requires openpyxl (pip install openpyxl)")
+        self.cell_type, self.font, self.column_letter = WriteOnlyCell, Font, get_column_letter
+        self.workbook = Workbook(write_only=True)
+        self.target = (stdout or sys.stdout).buffer if target == STDOUT else target
+        self.split_column = SPLIT_COLUMNS[split_by] if split_by else None
+        self.sheets = {}
+        self.columns = None
+        self.rows = 0
+
+    def _sheet(self, key):
+        title = 'Data' if key is None else re.sub(r'[\[\]:*?/\\]', '_', str(key))[:31] or '_'
+        ws = self.workbook.create_sheet(title)
+        # 列宽与冻结窗格须在写入第一行之前设置
+        for i, col in enumerate(self.columns, 1):
+            ws.column_dimensions[self.column_letter(i)].width = max(10, len(col) + 2)
+        ws.freeze_panes = 'A2'
+        header = []
+        for col in self.columns:
+            cell = self.cell_type(ws, col)
+            cell.font = self.font(bold=True)
+            header.append(cell)
+        ws.append(header)
+        # 每个指数列一个带数字格式的单元格：append 同步写出，逐行只改其值，不为每个数值新建单元格
+        templates = []
+        for col in self.columns:
+            if col in IDX_COLUMNS:
+                cell = self.cell_type(ws)
+                cell.number_format = IDX_NUMBER_FORMAT
+                templates.append(cell)
+            else:
+                templates.append(None)
+        sheet = self.sheets[key] = (ws, templates)
+        return sheet
+
+    def write(self, chunk):
+        frame = to_export_frame(chunk)
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        values = [frame[col].to_numpy(dtype=object, na_value=None).tolist() for col in self.columns]
+        keys = frame[self.split_column].tolist() if self.split_column else [None] * len(frame)
+        styled = [i for i, col in enumerate(self.columns) if col in IDX_COLUMNS]
+        for key, row in zip(keys, zip(*values)):
+            sheet = self.sheets.get(key) or self._sheet(key)
+            ws, templates = sheet
+            row = list(row)
+            for i in styled:
+                if row[i] is not None:
+                    cell = templates[i]
+                    cell.value = row[i]
+                    row[i] = cell
+            ws.append(row)
+        self.rows += len(frame)
+
+    def close(self):
+        self.workbook.save(self.target)
+
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonLinesWriter, 'json': JsonArrayWriter, 'parquet': ParquetWriter,
+           'xlsx': XlsxWriter}
+
+
+def infer_format(target, fmt=None):
+    if fmt:
+        return fmt
+    if target == STDOUT:
+        return 'csv'
+    return FORMAT_EXTENSIONS.get(os.path.splitext(target)[1].lower(), 'csv')
+
+
+def export_rows(df, row_filter, target, fmt=None, chunk_rows=CHUNK_ROWS, stdout=None, split_by=None):
+    # 写出器在第一个非空块到达时才创建：没有匹配行时不生成文件
+    fmt = infer_format(target, fmt)
+    if split_by and fmt != 'xlsx':
+        raise ValueError("Splitting into sheets is only supported for xlsx output")
+    options = {'split_by': split_by} if split_by else {}
+    writer = None
+    months, cities = set(), set()
+    try:
+        for chunk in row_filter.iter_chunks(df, chunk_rows):
+            if writer is None:
+                if target != STDOUT and os.path.dirname(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                writer = WRITERS[fmt](target, stdout, **options)
+            writer.write(chunk)
+            chunk_months = chunk[MONTH_COLUMN].to_numpy()
+            months.update(np.unique(chunk_months[chunk_months >= 0]).tolist())
+            cities.update(np.unique(chunk[CITY_CODE_COLUMN].to_numpy()).tolist())
+    finally:
+        if writer is not None:
+            writer.close()
+    stats = {'rows': writer.rows if writer else 0, 'months': len(months), 'cities': len(cities)}
+    if split_by:
+        stats['sheets'] = len(writer.sheets) if writer else 0
+    return stats
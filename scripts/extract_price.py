@@ -6,15 +6,20 @@
 import sys
 import os
 import argparse
-
-try:
-    import pandas as pd
-    HAS_DEPS = True
-except ImportError:
-    HAS_DEPS = False
+import importlib.util
+from contextlib import redirect_stdout
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from config import CSV_PATH, OUTPUT_DIR, CITY_NAME_ALIASES, ALLOWED_FIXED_BASE, normalize_city_name
+from daemon_client import forward_to_daemon
+if __name__ == '__main__':
+    forward_to_daemon('extract_price')
+
+# pandas 只在真正读取数据时导入，list-cities / list-dates 直接读元信息清单
+HAS_DEPS = importlib.util.find_spec('pandas') is not None
+
+from config import CSV_PATH, OUTPUT_DIR, ALLOWED_FIXED_BASE, IDX_COLUMNS, resolve_city_code
+from profiling import span, add_profile_args, configure as configure_profiling
+from data_meta import load_metadata
 
 
 def parse_month_arg(month_str):
@@ -25,44 +30,29 @@ def parse_month_arg(month_str):
     return year, month
 
 
-def date_to_comparable(date_str):
-    try:
-        parts = date_str.split('/')
-        return (int(parts[0]), int(parts[1]))
-    except:
-        return None
-
-
-def load_data():
-    if not os.path.exists(CSV_PATH):
-        print(f"Error: CSV file not found: {CSV_PATH}")
-        sys.exit(1)
-    print(f"Reading data file: {CSV_PATH}")
-    df = pd.read_csv(CSV_PATH, dtype=str)
-    print(f"Total records: {len(df)}")
-    return df
-
-
-def extract_by_month(df, start_year, start_month, end_year, end_month):
-    start_tuple, end_tuple = (start_year, start_month), (end_year, end_month)
+def extract_by_month(row_filter, start_year, start_month, end_year, end_month):
+    from data_store import month_key
     print(f"Extracting: {start_year}/{start_month} to {end_year}/{end_month}")
-    mask = df['DATE'].apply(lambda x: start_tuple <= date_to_comparable(x) <= end_tuple if date_to_comparable(x) else False)
-    return df[mask].copy()
+    return row_filter.months(month_key(start_year, start_month), month_key(end_year, end_month))
 
 
-def extract_by_city(df, cities):
+def extract_by_city(row_filter, cities, df=None):
     print(f"Extracting cities: {', '.join(cities)}")
-    requested = {normalize_city_name(c) for c in cities}
-    mask = df['CITY'].apply(lambda x: normalize_city_name(x) in requested)
-    return df[mask].copy()
+    if df is None:
+        unknown = [c for c in cities if resolve_city_code(c) < 0]
+    else:
+        from data_store import resolve_city_codes
+        unknown = [c for c in cities if not resolve_city_codes([c], df['CITY'])]
+    if unknown:
+        print(f"WARNING: City not found: {', '.join(unknown)}")
+    return row_filter.cities(cities)
 
 
-def extract_by_fixedbase(df, fixedbases):
+def extract_by_fixedbase(row_filter, fixedbases):
     if not fixedbases:
-        return df
+        return row_filter
     print(f"Filter by index type: {', '.join(sorted(fixedbases))}")
-    mask = df['FixedBase'].isin(fixedbases)
-    return df[mask].copy()
+    return row_filter.fixedbase(fixedbases)
 
 
 def parse_fixedbase_arg(arg):
@@ -75,31 +65,59 @@ def parse_fixedbase_arg(arg):
     return set(parts) if parts else None
 
 
-def print_stats(df, extracted_df):
-    print(f"Extracted {len(extracted_df)} records")
-    if len(extracted_df) > 0:
-        months = sorted(set(date_to_comparable(d) for d in extracted_df['DATE'].dropna()))
-        cities = extracted_df['CITY'].unique()
-        print(f"Months: {len(months)}, Cities: {len(cities)}")
+def print_stats(stats):
+    print(f"Extracted {stats['rows']} records")
+    if stats['rows'] > 0:
+        print(f"Months: {stats['months']}, Cities: {stats['cities']}")
 
 
-def save_data(df, output_path):
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    if output_path.endswith('.xlsx'):
-        df.to_excel(output_path, index=False)
-    elif output_path.endswith('.json'):
-        df.to_json(output_path, orient='records', force_ascii=False, indent=2)
-    else:
-        df.to_csv(output_path, index=False, quoting=1)
-    print(f"\nData saved to: {output_path}")
+def save_data(df, row_filter, output_path, fmt=None, chunk_rows=None, stdout=None, split_by=None):
+    # 筛选结果按块流式写出（xlsx 亦然，可按城市/指数类型分工作表）
+    from export_stream import CHUNK_ROWS, STDOUT, export_rows, infer_format
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    with span('export', format=infer_format(output_path, fmt)) as sp:
+        stats = export_rows(df, row_filter, output_path, fmt, chunk_rows, stdout, split_by)
+        sp.record(rows=stats['rows'])
+    print_stats(stats)
+    if stats.get('sheets'):
+        print(f"Sheets: {stats['sheets']} (one per {split_by})")
+    if stats['rows'] > 0 and output_path != STDOUT:
+        print(f"\nData saved to: {output_path}")
+    return stats
 
 
 def get_output_path(filename):
+    if filename == '-':
+        return filename
     if os.path.sep in filename or '/' in filename:
         return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', filename)
     return os.path.join(OUTPUT_DIR, filename)
 
 
+def load_as_of(spec):
+    from vintage_store import load_vintage_frame
+    print(f"Reading data as of vintage: {spec}")
+    with span('load_vintage') as sp:
+        df = load_vintage_frame(CSV_PATH, spec)
+        sp.record(rows=len(df))
+    print(f"Total records: {len(df)}")
+    return df
+
+
+def run_extract(args, build_filter, default_output):
+    from data_store import load_data
+    from export_stream import RowFilter
+    stdout = sys.stdout
+    output = get_output_path(args.output or default_output)
+    # 数据写到标准输出时，进度信息改写到标准错误，便于接管道
+    with redirect_stdout(sys.stderr if output == '-' else stdout):
+        df = load_as_of(args.as_of) if args.as_of else load_data()
+        row_filter = build_filter(RowFilter(), df)
+        if args.fixedbase:
+            row_filter = extract_by_fixedbase(row_filter, parse_fixedbase_arg(args.fixedbase))
+        return save_data(df, row_filter, output, args.format, args.chunk_rows, stdout, args.split_by)
+
+
 def cmd_month(args):
     if not HAS_DEPS:
         print("Error: pandas is required")
@@ -109,15 +127,8 @@ def cmd_month(args):
     if (start_year, start_month) > (end_year, end_month):
         print("Error: start month must be before end month")
         sys.exit(1)
-    df = load_data()
-    extracted_df = extract_by_month(df, start_year, start_month, end_year, end_month)
-    if args.fixedbase:
-        extracted_df = extract_by_fixedbase(extracted_df, parse_fixedbase_arg(args.fixedbase))
-    print_stats(df, extracted_df)
-    if len(extracted_df) > 0:
-        output = args.output or f"70cityprice_{start_year}{start_month:02d}_{end_year}{end_month:02d}.csv"
-        save_data(extracted_df, get_output_path(output))
-    return extracted_df
+    return run_extract(args, lambda f, df: extract_by_month(f, start_year, start_month, end_year, end_month),
+                       f"70cityprice_{start_year}{start_month:02d}_{end_year}{end_month:02d}.csv")
 
 
 def cmd_city(args):
@@ -127,42 +138,118 @@ def cmd_city(args):
     if not args.cities:
         print("Error: please specify at least one city")
         sys.exit(1)
+    cities_str = '_'.join(args.cities[:3]) + ('_etc' if len(args.cities) > 3 else '')
+    return run_extract(args, lambda f, df: extract_by_city(f, args.cities, df), f"70cityprice_{cities_str}.csv")
+
+
+def cmd_rank(args):
+    if not HAS_DEPS:
+        print("Error: pandas is required")
+        sys.exit(1)
+    from data_store import month_key
+    from price_cube import load_cube
+    from ranking import rank_cities, latest_month
+    cube = load_cube(CSV_PATH)
+    if args.start or args.end:
+        start = month_key(*parse_month_arg(args.start)) if args.start else cube.start_key
+        end = month_key(*parse_month_arg(args.end)) if args.end else cube.end_key
+        month_keys = list(range(start, end + 1))
+    elif args.months:
+        month_keys = [month_key(*parse_month_arg(m)) for m in args.months]
+    else:
+        latest = latest_month(cube, args.fixedbase, args.column)
+        month_keys = [] if latest is None else [latest]
+    largest = not args.bottom
+    with span('rank', months=len(month_keys)) as sp:
+        ranked = rank_cities(cube, month_keys, args.fixedbase, args.column, args.k, largest)
+        sp.record(rows=len(ranked))
+    if ranked.empty:
+        print("No data for the requested months")
+        return ranked
+
+    if args.output:
+        output = get_output_path(args.output)
+        if output == '-':
+            ranked.to_csv(sys.stdout, index=False, lineterminator='\n')
+        else:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            ranked.to_csv(output, index=False, quoting=1)
+            print(f"Ranked {ranked['DATE'].nunique()} months, saved to: {output}")
+        return ranked
+
+    label = 'Top' if largest else 'Bottom'
+    for date, group in ranked.groupby('DATE', sort=False):
+        print(f"\n{date} {args.fixedbase} {args.column} - {label} {args.k} of {group['CITIES'].iloc[0]} cities")
+        for row in group.itertuples(index=False):
+            print(f"  {row.RANK:>2}. {row.CITY:<6} {getattr(row, args.column):>7.1f}   P{row.PERCENTILE:.1f}")
+    return ranked
+
+
+def data_metadata():
+    meta = load_metadata(CSV_PATH)
+    if meta is not None:
+        return meta
+    if not HAS_DEPS:
+        print("Error: pandas is required")
+        sys.exit(1)
+    from data_store import load_data, source_stat, write_metadata
     df = load_data()
-    extracted_df = extract_by_city(df, args.cities)
-    if args.fixedbase:
-        extracted_df = extract_by_fixedbase(extracted_df, parse_fixedbase_arg(args.fixedbase))
-    print_stats(df, extracted_df)
-    if len(extracted_df) > 0:
-        cities_str = '_'.join(args.cities[:3]) + ('_etc' if len(args.cities) > 3 else '')
-        output = args.output or f"70cityprice_{cities_str}.csv"
-        save_data(extracted_df, get_output_path(output))
-    return extracted_df
+    return load_metadata(CSV_PATH) or write_metadata(CSV_PATH, df, source_stat(CSV_PATH))
 
 
 def cmd_list_cities(args):
-    df = load_data()
-    cities = sorted(df['CITY'].unique())
+    cities = data_metadata()['cities']
     print(f"\nAvailable cities ({len(cities)}):\n")
     for i in range(0, len(cities), 5):
         print("  " + "  ".join(f"{c:<8}" for c in cities[i:i+5]))
 
 
 def cmd_list_dates(args):
-    df = load_data()
-    all_dates = sorted(set(date_to_comparable(d) for d in df['DATE'].dropna()))
-    if all_dates:
-        print(f"\nData date range: {all_dates[0][0]}/{all_dates[0][1]} to {all_dates[-1][0]}/{all_dates[-1][1]}")
-        print(f"Total months: {len(all_dates)}")
+    meta = data_metadata()
+    if meta['month_count']:
+        (first_year, first_month), (last_year, last_month) = meta['first_month'], meta['last_month']
+        print(f"\nData date range: {first_year}/{first_month} to {last_year}/{last_month}")
+        print(f"Total months: {meta['month_count']}")
     else:
         print("No valid date data found")
 
 
-def main():
+def _format_bytes(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def cmd_memory_report(args):
     if not HAS_DEPS:
-        print("Error: pandas is required. Run: pip install pandas openpyxl")
+        print("Error: pandas is required")
         sys.exit(1)
-    
+    from data_store import read_raw_csv, read_typed, memory_report
+    with span('read_raw') as sp:
+        raw = read_raw_csv(CSV_PATH)
+        sp.record(rows=len(raw))
+    with span('load_data') as sp:
+        typed = read_typed(CSV_PATH)
+        sp.record(rows=len(typed))
+    report = memory_report(raw, typed)
+    print(f"\nMemory by column ({len(typed)} rows, raw = text as read from CSV, typed = loaded frame):\n")
+    print(f"  {'Column':<26}{'Raw dtype':<12}{'Raw':>12}  {'Typed dtype':<14}{'Typed':>12}{'Ratio':>8}")
+    for row in report.itertuples(index=False):
+        ratio = f"{row.raw_bytes / row.typed_bytes:.1f}x" if row.raw_bytes and row.typed_bytes else '-'
+        print(f"  {row.column:<26}{row.raw_dtype:<12}{_format_bytes(row.raw_bytes):>12}  "
+              f"{row.typed_dtype:<14}{_format_bytes(row.typed_bytes):>12}{ratio:>8}")
+    raw_total, typed_total = int(report['raw_bytes'].sum()), int(report['typed_bytes'].sum())
+    print(f"  {'Total':<26}{'':<12}{_format_bytes(raw_total):>12}  {'':<14}{_format_bytes(typed_total):>12}"
+          f"{raw_total / max(typed_total, 1):>7.1f}x")
+    print(f"  Bytes per row: {raw_total / max(len(raw), 1):.0f} -> {typed_total / max(len(typed), 1):.0f}")
+    return report
+
+
+def main():
     parser = argparse.ArgumentParser(description='70 City House Price Data Extraction Tool')
+    add_profile_args(parser)
     subparsers = parser.add_subparsers(dest='command')
     
     month_parser = subparsers.add_parser('month', help='Extract by month range')
@@ -177,15 +264,38 @@ def main():
     city_parser.add_argument('--output', '-o')
     city_parser.add_argument('--fixedbase', '-f')
     city_parser.set_defaults(func=cmd_city)
+
+    for sub in (month_parser, city_parser):
+        sub.add_argument('--format', choices=['csv', 'jsonl', 'json', 'parquet', 'xlsx'],
+                         help="Output format (default: from the file extension; csv for '-' stdout)")
+        sub.add_argument('--chunk-rows', type=int, help='Rows per streamed chunk')
+        sub.add_argument('--split-by', choices=['city', 'fixedbase'],
+                         help='xlsx only: one worksheet per city or per index type')
+        sub.add_argument('--as-of', metavar='VINTAGE',
+                         help='Read the data as of a recorded vintage (number or YYYY-MM-DD, see vintage_store.py list)')
     
+    rank_parser = subparsers.add_parser('rank', help='Top/bottom-k cities per month')
+    rank_parser.add_argument('months', nargs='*', help='Months YYYYMM (default: latest month)')
+    rank_parser.add_argument('--start', help='Rank every month from this month (YYYYMM)')
+    rank_parser.add_argument('--end', help='... up to this month (YYYYMM)')
+    rank_parser.add_argument('--column', '-c', default='CommodityHouseIDX', choices=IDX_COLUMNS)
+    rank_parser.add_argument('--fixedbase', '-f', default='环比', choices=sorted(ALLOWED_FIXED_BASE))
+    rank_parser.add_argument('-k', type=int, default=5, help='Number of cities per month')
+    rank_parser.add_argument('--bottom', action='store_true', help='Lowest values instead of highest')
+    rank_parser.add_argument('--output', '-o', help="Write all rows as CSV ('-' for stdout)")
+    rank_parser.set_defaults(func=cmd_rank)
+
     subparsers.add_parser('list-cities', help='List available cities').set_defaults(func=cmd_list_cities)
     subparsers.add_parser('list-dates', help='List date range').set_defaults(func=cmd_list_dates)
+    subparsers.add_parser('memory-report', help='Per-column memory of the raw text vs the loaded frame'
+                          ).set_defaults(func=cmd_memory_report)
     
     args = parser.parse_args()
     
     if args.command is None:
         parser.print_help()
         sys.exit(0)
+    configure_profiling(args, 'extract_price')
     
     try:
         args.func(args)
@@ -5,31 +5,43 @@
 
 import sys
 import os
+import math
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from daemon_client import forward_to_daemon
+if __name__ == '__main__':
+    forward_to_daemon('generate_chart')
 
 try:
+    import numpy as np
     import pandas as pd
-    import matplotlib.pyplot as plt
+    import matplotlib
     import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+    from matplotlib.collections import LineCollection
     HAS_DEPS = True
 except ImportError:
     HAS_DEPS = False
 
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from config import CSV_PATH, OUTPUT_DIR, normalize_city_name, CITY_ADCODE
-
+from config import (CSV_PATH, OUTPUT_DIR, CHART_CONFIG_PATH, ALLOWED_FIXED_BASE, CITY_ADCODE, CITY_CODE,
+                    normalize_city_name)
+from profiling import span, add_profile_args, configure as configure_profiling
 if HAS_DEPS:
-    plt.rcParams['font.sans-serif'] = ['SimHei', 'Heiti SC', 'Microsoft YaHei', 'Arial Unicode MS']
-    plt.rcParams['axes.unicode_minus'] = False
+    from data_store import (load_data, month_key, month_from_key, month_to_datetime64, month_slice,
+                            filter_cities, city_code_series, city_code_table)
+    from render_cache import RenderCache
+    from price_cube import load_cube
+    from ranking import rank_cities, latest_month
+    matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Heiti SC', 'Microsoft YaHei', 'Arial Unicode MS']
+    matplotlib.rcParams['axes.unicode_minus'] = False
 
-
-def load_data():
-    if not os.path.exists(CSV_PATH):
-        print(f"ERROR: CSV file not found: {CSV_PATH}")
-        sys.exit(1)
-    print(f"Reading data file: {CSV_PATH}")
-    df = pd.read_csv(CSV_PATH, dtype=str)
-    return df
+DEFAULT_FIGSIZE = (12, 6)
+DEFAULT_DPI = 150
+# multiples / overlay 用于一次绘制大量城市（如全部70城）
+CHART_TYPES = ('line', 'bar', 'multiples', 'overlay')
 
 
 def parse_month_arg(month_str):
@@ -40,37 +52,67 @@ def parse_month_arg(month_str):
 
 
 def filter_data(df, cities, start_month, end_month, fixedbase):
-    def date_in_range(date_str):
-        try:
-            parts = date_str.split('/')
-            return (int(parts[0]), int(parts[1]))
-        except:
-            return None
-    
-    if start_month:
-        sy, sm = parse_month_arg(start_month)
-        df = df[df['DATE'].apply(lambda x: date_in_range(x) >= (sy, sm) if date_in_range(x) else False)]
-    if end_month:
-        ey, em = parse_month_arg(end_month)
-        df = df[df['DATE'].apply(lambda x: date_in_range(x) <= (ey, em) if date_in_range(x) else False)]
-    
-    city_norms = {normalize_city_name(c) for c in cities}
-    df = df[df['CITY'].apply(lambda x: normalize_city_name(x) in city_norms)]
+    start_key = month_key(*parse_month_arg(start_month)) if start_month else None
+    end_key = month_key(*parse_month_arg(end_month)) if end_month else None
+    df = month_slice(df, start_key, end_key)
+    
+    df = filter_cities(df, cities)
     if fixedbase:
         df = df[df['FixedBase'] == fixedbase]
     return df
 
 
-def create_trend_chart(df, cities, fixedbase, output_path):
-    fig, ax = plt.subplots(figsize=(12, 6), dpi=150)
+def ranked_cities(k, fixedbase='同比', end_month=None, largest=True, column='CommodityHouseIDX'):
+    # 按截止月份（默认最新月份）的指数值取前/后 k 个城市
+    cube = load_cube(CSV_PATH)
+    key = month_key(*parse_month_arg(end_month)) if end_month else latest_month(cube, fixedbase, column)
+    if key is None:
+        return []
+    return rank_cities(cube, [key], fixedbase, column, k, largest)['CITY'].tolist()
+
+
+def price_matrix(df, cities, column='CommodityHouseIDX'):
+    # 长表一次展开为 月份×城市 的 float 矩阵，没有任何数据的月份不保留
+    codes = df['CITY_CODE'].to_numpy() if 'CITY_CODE' in df.columns else city_code_series(df['CITY'])
+    table = city_code_table(df['CITY'])
+    lookup = np.full(len(CITY_CODE) + len(table) + 1, -1, dtype=np.int64)
+    for i, city in enumerate(cities):
+        code = table.get(normalize_city_name(city), -1)
+        if code >= 0:
+            lookup[code] = i
+    months = df['MONTH'].to_numpy().astype(np.int64)
+    cols = lookup[codes.astype(np.int64)]
+    keep = (months >= 0) & (cols >= 0)
+    if not keep.any():
+        return pd.DataFrame(columns=list(cities), dtype=np.float64)
+    lo, hi = months[keep].min(), months[keep].max()
+    matrix = np.full((hi - lo + 1, len(cities)), np.nan)
+    matrix[months[keep] - lo, cols[keep]] = df[column].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+    present = ~np.isnan(matrix).all(axis=1)
+    index = pd.Index(np.arange(lo, hi + 1)[present], name='MONTH')
+    return pd.DataFrame(matrix[present], index=index, columns=list(cities))
+
+
+def _month_label(key):
+    year, month = month_from_key(key)
+    return f'{year}/{month}/1'
+
+
+# 图表直接使用 Figure 对象而不经过 pyplot 的全局状态，可在多个线程中同时渲染
+def create_trend_chart(matrix, cities, fixedbase, output_path, figsize=DEFAULT_FIGSIZE, dpi=DEFAULT_DPI, style=None):
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.subplots()
     colors = {'北京': '#E53935', '上海': '#1E88E5', '广州': '#43A047', '深圳': '#FB8C00'}
+    palette = (style or {}).get('palette')
+    dates = month_to_datetime64(matrix.index)
+    values = matrix.to_numpy()
     
-    for city in cities:
-        city_data = df[df['CITY'] == city].copy()
-        city_data = city_data.sort_values('DATE')
-        city_data['DATE_PARSED'] = pd.to_datetime(city_data['DATE'], format='%Y/%m/%d')
-        color = colors.get(city, plt.cm.tab10(cities.index(city) % 10))
-        ax.plot(city_data['DATE_PARSED'], city_data['CommodityHouseIDX'], label=city, linewidth=1.5, color=color)
+    for i, city in enumerate(cities):
+        if palette:
+            color = palette[i % len(palette)]
+        else:
+            color = colors.get(city, matplotlib.colormaps['tab10'](i % 10))
+        ax.plot(dates, values[:, i], label=city, linewidth=1.5, color=color)
     
     ax.axhline(y=100, color='gray', linestyle='--', alpha=0.5, linewidth=1)
     ax.set_title(f'新建商品住宅价格指数趋势（{fixedbase}）', fontsize=14, fontweight='bold', pad=15)
@@ -80,25 +122,22 @@ def create_trend_chart(df, cities, fixedbase, output_path):
     ax.grid(True, alpha=0.3)
     ax.xaxis.set_major_locator(mdates.MonthLocator(interval=6))
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
-    plt.xticks(rotation=45)
+    ax.tick_params(axis='x', labelrotation=45)
     ax.text(0.02, 0.02, '数据来源：国家统计局', transform=ax.transAxes, fontsize=9, color='gray', alpha=0.7)
-    plt.tight_layout()
-    plt.savefig(output_path, bbox_inches='tight', facecolor='white')
-    print(f'图表已保存至: {output_path}')
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(output_path, bbox_inches='tight', facecolor='white')
 
 
-def create_bar_chart(df, cities, fixedbase, output_path):
-    fig, ax = plt.subplots(figsize=(12, 6), dpi=150)
-    latest_date = df['DATE'].max()
-    latest_data = df[df['DATE'] == latest_date].copy()
-    x, values = range(len(cities)), []
+def create_bar_chart(matrix, cities, fixedbase, output_path, figsize=DEFAULT_FIGSIZE, dpi=DEFAULT_DPI, style=None):
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.subplots()
+    latest_date = _month_label(matrix.index[-1])
+    latest = matrix.to_numpy()[-1]
+    x, values = range(len(cities)), [0.0 if np.isnan(v) else float(v) for v in latest]
     
-    for city in cities:
-        cv = latest_data[latest_data['CITY'] == city]
-        values.append(float(cv['CommodityHouseIDX'].iloc[0]) if len(cv) > 0 else 0)
-    
-    colors = ['#E53935' if v < 100 else '#43A047' for v in values]
+    style = style or {}
+    negative, positive = style.get('negative', '#E53935'), style.get('positive', '#43A047')
+    colors = [negative if v < 100 else positive for v in values]
     ax.bar(x, values, color=colors, alpha=0.8, edgecolor='black', linewidth=0.5)
     ax.axhline(y=100, color='gray', linestyle='--', alpha=0.7, linewidth=1)
     ax.set_xticks(x)
@@ -109,10 +148,250 @@ def create_bar_chart(df, cities, fixedbase, output_path):
         ax.text(i, val + 0.5, f'{val:.1f}', ha='center', va='bottom', fontsize=10)
     ax.set_ylim(85, max(values) + 5)
     ax.grid(True, alpha=0.3, axis='y')
-    plt.tight_layout()
-    plt.savefig(output_path, bbox_inches='tight', facecolor='white')
-    print(f'图表已保存至: {output_path}')
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(output_path, bbox_inches='tight', facecolor='white')
+
+
+def create_multiples_chart(matrix, cities, fixedbase, output_path, figsize=DEFAULT_FIGSIZE, dpi=DEFAULT_DPI, style=None):
+    # 小多图：每个城市占网格中的一格，统一纵轴范围；所有城市的折线平移到各自格子后
+    # 合并为一个 LineCollection 绘制，避免创建几十个子图及其刻度
+    ncols = min(10, len(cities))
+    nrows = math.ceil(len(cities) / ncols)
+    fig = Figure(figsize=(max(figsize[0], ncols * 1.6), max(figsize[1], nrows * 1.2)), dpi=dpi)
+    ax = fig.subplots()
+    values = matrix.to_numpy()
+    lo, hi = np.nanmin(values), np.nanmax(values)
+    lo, hi = min(lo, 100.0), max(hi, 100.0)
+    value_range = (hi - lo) or 1.0
+    n = len(matrix)
+    x = 0.05 + 0.9 * (np.arange(n) / max(n - 1, 1))
+    rows, cols = np.divmod(np.arange(len(cities)), ncols)
+    x0 = cols[:, None] + x[None, :]
+    y0 = (nrows - 1 - rows)[:, None] + 0.08 + 0.72 * (values.T - lo) / value_range
+    baseline = (nrows - 1 - rows) + 0.08 + 0.72 * (100.0 - lo) / value_range
+
+    color = ((style or {}).get('palette') or ['#1E88E5'])[0]
+    ax.add_collection(LineCollection(np.stack([x0, y0], axis=-1), colors=color, linewidths=0.8))
+    ax.add_collection(LineCollection([[(c + 0.05, b), (c + 0.95, b)] for c, b in zip(cols, baseline)],
+                                     colors='gray', linestyles='--', linewidths=0.5, alpha=0.6))
+    frames = [[(c + 0.02, r), (c + 0.98, r), (c + 0.98, r + 0.96), (c + 0.02, r + 0.96), (c + 0.02, r)]
+              for c, r in zip(cols, nrows - 1 - rows)]
+    ax.add_collection(LineCollection(frames, colors='#BDBDBD', linewidths=0.5))
+    for city, c, r in zip(cities, cols, nrows - 1 - rows):
+        ax.text(c + 0.06, r + 0.9, city, fontsize=8, va='top')
+    ax.set_xlim(0, ncols)
+    ax.set_ylim(-0.02, nrows)
+    ax.set_axis_off()
+
+    start, end = month_from_key(matrix.index[0]), month_from_key(matrix.index[-1])
+    ax.set_title(f'新建商品住宅价格指数（{fixedbase}，{len(cities)}城）', fontsize=14, fontweight='bold', pad=10)
+    fig.text(0.01, 0.01, f'{start[0]}-{start[1]:02d} 至 {end[0]}-{end[1]:02d}，纵轴统一为 {lo:.1f}~{hi:.1f}，虚线为 100'
+             '；数据来源：国家统计局', fontsize=9, color='gray')
+    fig.subplots_adjust(left=0.01, right=0.99, bottom=0.04, top=0.94)
+    fig.savefig(output_path, facecolor='white')
+
+
+def create_overlay_chart(matrix, cities, fixedbase, output_path, figsize=DEFAULT_FIGSIZE, dpi=DEFAULT_DPI, style=None):
+    # 全部城市作为一个 LineCollection 一次绘制，并叠加各月中位数
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.subplots()
+    values = matrix.to_numpy()
+    x = mdates.date2num(month_to_datetime64(matrix.index))
+    segments = np.stack([np.broadcast_to(x, values.T.shape), values.T], axis=-1)
+    ax.add_collection(LineCollection(segments, colors='#9E9E9E', linewidths=0.6, alpha=0.5))
+    has_data = ~np.isnan(values).all(axis=0)
+    median = np.nanmedian(values[:, has_data], axis=1)
+    color = (style or {}).get('negative', '#E53935')
+    ax.plot(x, median, color=color, linewidth=2, label=f'中位数（{int(has_data.sum())}城）')
+    ax.autoscale_view()
+    
+    ax.axhline(y=100, color='gray', linestyle='--', alpha=0.5, linewidth=1)
+    ax.set_title(f'新建商品住宅价格指数分布（{fixedbase}）', fontsize=14, fontweight='bold', pad=15)
+    ax.set_xlabel('时间', fontsize=11)
+    ax.set_ylabel('价格指数', fontsize=11)
+    ax.legend(loc='upper right', framealpha=0.9)
+    ax.grid(True, alpha=0.3)
+    ax.xaxis_date()
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.text(0.02, 0.02, '数据来源：国家统计局', transform=ax.transAxes, fontsize=9, color='gray', alpha=0.7)
+    fig.tight_layout()
+    fig.savefig(output_path, bbox_inches='tight', facecolor='white')
+
+
+CHART_RENDERERS = {'line': create_trend_chart, 'bar': create_bar_chart,
+                   'multiples': create_multiples_chart, 'overlay': create_overlay_chart}
+
+
+def default_output_path(cities, fixedbase, chart_type='line'):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if len(cities) == len(CITY_ADCODE):
+        cities_str = 'all'
+    else:
+        cities_str = '_'.join(cities[:2]) + ('_etc' if len(cities) > 2 else '')
+    suffix = '' if chart_type == 'line' else f'_{chart_type}'
+    return os.path.join(OUTPUT_DIR, f"chart_{cities_str}_{fixedbase}{suffix}.png")
+
+
+def render_chart(df, cities, fixedbase='同比', chart_type='line', output_path=None,
+                 figsize=DEFAULT_FIGSIZE, dpi=DEFAULT_DPI, style=None, quiet=False, cache=None):
+    # df 为已按城市/月份筛选的长表（可包含多种指数类型），或 月份×城市 矩阵（如 PriceCube.frame 的结果）；
+    # 返回 (输出路径, 是否命中渲染缓存)
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f"Unknown chart type: {chart_type}")
+    if 'CITY' in df.columns:
+        if 'FixedBase' in df.columns:
+            df = df[df['FixedBase'] == fixedbase]
+        matrix = price_matrix(df, cities)
+    else:
+        matrix = df.reindex(columns=list(cities)).astype(np.float64).dropna(how='all')
+    if len(matrix) == 0:
+        raise ValueError(f"No {fixedbase} data to plot")
+    output_path = output_path or default_output_path(cities, fixedbase, chart_type)
+    cache = cache or RenderCache()
+    params = {'type': chart_type, 'cities': list(cities), 'fixedbase': fixedbase, 'figsize': list(figsize),
+              'dpi': dpi, 'style': style, 'format': os.path.splitext(output_path)[1].lower()}
+    with span('render_chart', type=chart_type, cities=len(cities), rows=len(matrix)) as sp:
+        fp = cache.fingerprint(matrix.reset_index(), params, __file__)
+        if cache.fetch(fp, output_path):
+            sp.record(cached=True)
+            if not quiet:
+                print(f'图表未变化，使用缓存: {output_path}')
+            return output_path, True
+        CHART_RENDERERS[chart_type](matrix, cities, fixedbase, output_path, figsize, dpi, style)
+        cache.store(fp, output_path)
+        sp.record(cached=False)
+    if not quiet:
+        print(f'图表已保存至: {output_path}')
+    return output_path, False
+
+
+def load_yaml(path):
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError("PyYAML is required for --batch. Run: pip install pyyaml")
+    with open(path, encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def chart_style(config):
+    colors = config.get('colors') or {}
+    chart = config.get('chart') or {}
+    export = config.get('export') or {}
+    return {
+        'palette': colors.get('default'),
+        'positive': colors.get('positive', '#43A047'),
+        'negative': colors.get('negative', '#E53935'),
+        'figsize': (chart.get('width', DEFAULT_FIGSIZE[0]), chart.get('height', DEFAULT_FIGSIZE[1])),
+        'dpi': chart.get('dpi', DEFAULT_DPI),
+        'format': export.get('default_format', 'png'),
+        'formats': export.get('formats') or ['png'],
+    }
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def _resolve_cities(value):
+    if value == 'all':
+        return list(CITY_ADCODE)
+    cities = []
+    for city in _as_list(value):
+        norm = normalize_city_name(city)
+        if norm in CITY_ADCODE:
+            cities.append(norm)
+        else:
+            print(f"WARNING: City '{city}' not found")
+    return cities
+
+
+def expand_jobs(spec, style, output_dir):
+    # 每个条目可用列表展开为多张图：fixedbase / type / format，per_city 为每个城市各出一张
+    defaults = spec.get('defaults') or {}
+    jobs = []
+    for entry in spec.get('jobs') or []:
+        entry = {**defaults, **entry}
+        cities = _resolve_cities(entry.get('cities', 'all'))
+        if not cities:
+            raise ValueError(f"No valid cities in job: {entry}")
+        groups = [[c] for c in cities] if entry.get('per_city') else [cities]
+        formats = [str(f) for f in _as_list(entry.get('format', style['format']))]
+        unsupported = sorted(set(formats) - set(style['formats']))
+        if unsupported:
+            raise ValueError(f"Export format not enabled in chart config: {', '.join(unsupported)}")
+        for group in groups:
+            for fixedbase in _as_list(entry.get('fixedbase', '同比')):
+                if fixedbase not in ALLOWED_FIXED_BASE:
+                    raise ValueError(f"Invalid index type: {fixedbase}")
+                for chart_type in _as_list(entry.get('type', 'line')):
+                    if chart_type not in CHART_TYPES:
+                        raise ValueError(f"Unknown chart type: {chart_type}")
+                    label = '_'.join(group[:2]) + ('_etc' if len(group) > 2 else '')
+                    template = entry.get('output', 'chart_{cities}_{fixedbase}_{type}')
+                    name = template.format(cities=label, city=group[0], fixedbase=fixedbase, type=chart_type)
+                    jobs.append({
+                        'name': name, 'cities': group, 'fixedbase': fixedbase, 'type': chart_type,
+                        'start': str(entry['start']) if entry.get('start') else None,
+                        'end': str(entry['end']) if entry.get('end') else None,
+                        'paths': [os.path.join(output_dir, f'{name}.{fmt}') for fmt in formats],
+                    })
+    names = [job['name'] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Chart jobs produce duplicate output names, add {city}/{fixedbase}/{type} to 'output'")
+    return jobs
+
+
+def _init_worker():
+    matplotlib.use('Agg')
+
+
+def _render_job(df, job, style, use_cache=True):
+    started = time.perf_counter()
+    cache = RenderCache(reuse=use_cache)
+    cached = True
+    for path in job['paths']:
+        _, hit = render_chart(df, job['cities'], job['fixedbase'], job['type'], path,
+                              figsize=style['figsize'], dpi=style['dpi'], style=style, quiet=True, cache=cache)
+        cached = cached and hit
+    return time.perf_counter() - started, cached
+
+
+def run_batch(spec_path, workers=None, use_cache=True):
+    spec = load_yaml(spec_path)
+    style = chart_style(load_yaml(spec.get('config') or CHART_CONFIG_PATH))
+    output_dir = spec.get('output_dir') or OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = expand_jobs(spec, style, output_dir)
+    if not jobs:
+        raise ValueError(f"No chart jobs in {spec_path}")
+    workers = max(1, workers or os.cpu_count() or 1)
+    print(f"Batch mode: {len(jobs)} charts, {workers} workers")
+
+    df = load_data()
+    started = time.perf_counter()
+    failed, reused, job_seconds = 0, 0, 0.0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {}
+        for job in jobs:
+            job_df = filter_data(df, job['cities'], job['start'], job['end'], job['fixedbase'])
+            futures[pool.submit(_render_job, job_df, job, style, use_cache)] = job
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                seconds, cached = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[FAIL] {job['name']}: {e}")
+                continue
+            job_seconds += seconds
+            reused += cached
+            print(f"[OK] {job['name']} ({seconds:.2f}s{', cached' if cached else ''}): {', '.join(job['paths'])}")
+    elapsed = time.perf_counter() - started
+    print(f"Rendered {len(jobs) - failed}/{len(jobs)} charts in {elapsed:.2f}s "
+          f"(job time {job_seconds:.2f}s, {workers} workers, {reused} unchanged from cache)")
+    return failed == 0
 
 
 def main():
@@ -121,56 +400,70 @@ def main():
         sys.exit(1)
     
     parser = argparse.ArgumentParser(description='70 City House Price Chart Generator')
-    parser.add_argument('--cities', '-c', required=True, nargs='+', help='City list')
+    parser.add_argument('--cities', '-c', nargs='+', help="City list, or 'all' for all 70 cities")
+    parser.add_argument('--top', type=int, metavar='K', help='Use the K highest-ranked cities in the end month')
+    parser.add_argument('--bottom', type=int, metavar='K', help='Use the K lowest-ranked cities in the end month')
     parser.add_argument('--start', '-s', help='Start month (YYYYMM)')
     parser.add_argument('--end', '-e', help='End month (YYYYMM)')
-    parser.add_argument('--type', '-t', choices=['line', 'bar'], default='line', help='Chart type')
+    parser.add_argument('--type', '-t', choices=CHART_TYPES, default='line',
+                        help='Chart type (multiples/overlay draw many cities at once, default all 70)')
     parser.add_argument('--fixedbase', '-f', default='同比', choices=['同比', '环比', '定基比'], help='Index type')
     parser.add_argument('--output', '-o', help='Output file path')
     parser.add_argument('--width', type=float, default=12)
     parser.add_argument('--height', type=float, default=6)
     parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--batch', metavar='SPEC_YAML', help='Render every chart job in a YAML spec')
+    parser.add_argument('--workers', type=int, help='Worker processes for batch mode (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Re-render even if an identical chart is cached')
+    add_profile_args(parser)
     
     args = parser.parse_args()
+    configure_profiling(args, 'generate_chart')
     
     if not os.path.exists(CSV_PATH):
         print(f"ERROR: CSV file not found")
         sys.exit(1)
     
+    if args.batch:
+        try:
+            ok = run_batch(args.batch, args.workers, use_cache=not args.force)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        if not ok:
+            sys.exit(1)
+        print("[DONE] Batch chart generation complete!")
+        return
+    
+    if args.top or args.bottom:
+        args.cities = ranked_cities(args.top or args.bottom, args.fixedbase, args.end, largest=bool(args.top))
+        print(f"Ranked cities: {', '.join(args.cities)}")
+    
+    if not args.cities:
+        if args.type not in ('multiples', 'overlay'):
+            parser.error('--cities (or --top/--bottom) is required unless --batch is given')
+        args.cities = ['all']
+    
     df = load_data()
-    cities = []
-    for city in args.cities:
-        norm = normalize_city_name(city)
-        if norm in CITY_ADCODE:
-            cities.append(norm)
-        else:
-            print(f"WARNING: City '{city}' not found")
+    cities = _resolve_cities('all' if args.cities == ['all'] else args.cities)
     
     if not cities:
         print("ERROR: No valid cities specified")
         sys.exit(1)
     
-    plt.rcParams['figure.figsize'] = (args.width, args.height)
-    plt.rcParams['figure.dpi'] = args.dpi
-    
-    df_filtered = filter_data(df, cities, args.start, args.end, args.fixedbase)
+    with span('filter') as sp:
+        df_filtered = filter_data(df, cities, args.start, args.end, args.fixedbase)
+        sp.record(rows=len(df_filtered))
     print(f"Filtered records: {len(df_filtered)}")
     
     if len(df_filtered) == 0:
         print("ERROR: No data found matching criteria")
         sys.exit(1)
     
-    if args.output:
-        output_path = args.output
-    else:
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        cities_str = '_'.join(cities[:2]) + ('_etc' if len(cities) > 2 else '')
-        output_path = os.path.join(OUTPUT_DIR, f"chart_{cities_str}_{args.fixedbase}.png")
-    
-    if args.type == 'line':
-        create_trend_chart(df_filtered, cities, args.fixedbase, output_path)
-    else:
-        create_bar_chart(df_filtered, cities, args.fixedbase, output_path)
+    # 柱状图沿用原有的默认文件名
+    output_path = args.output or default_output_path(cities, args.fixedbase, 'line' if args.type == 'bar' else args.type)
+    render_chart(df_filtered, cities, args.fixedbase, args.type, output_path,
+                 figsize=(args.width, args.height), dpi=args.dpi, cache=RenderCache(reuse=not args.force))
     
     print("[DONE] Chart generation complete!")
 
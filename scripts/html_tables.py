@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 发布页表格提取
+
+用 lxml 解析一次发布页，只提取需要的表格（默认第 0/1/2/4 个），
+按 read_html 的规则筛选表格、展开 colspan/rowspan，直接返回单元格文本行，不构造 DataFrame。
+"""
+
+import re
+
+from lxml import etree
+from lxml import html as lxml_html
+
+RELEASE_TABLES = (0, 1, 2, 4)
+_PARSER = lxml_html.HTMLParser(encoding='utf-8')
+# 与 read_html 相同：只计入含有文本的表格（纯图片的版式表格不占编号）
+_TABLES_WITH_TEXT = etree.XPath("//table[.//text()[re:test(., '.+')]]",
+                                namespaces={'re': 'http://exslt.org/regular-expressions'})
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+
+
+def _cell_text(cell):
+    return _RE_WHITESPACE.sub(' ', cell.text_content()).strip()
+
+
+def _expand_spans(trs, remainder=None):
+    rows = []
+    remainder = remainder or []
+    for tr in trs:
+        texts, next_remainder, index = [], [], 0
+        for td in tr.iterchildren('td', 'th'):
+            while remainder and remainder[0][0] <= index:
+                prev_i, prev_text, prev_rowspan = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+                index += 1
+            text = _cell_text(td)
+            rowspan = int(td.get('rowspan') or 1)
+            for _ in range(int(td.get('colspan') or 1)):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+        rows.append(texts)
+        remainder = next_remainder
+    return rows, remainder
+
+
+def table_rows(table):
+    # 与 read_html 一致：thead 与开头的全 <th> 行作为表头，不计入数据行
+    body_trs = table.xpath('.//tbody//tr') + table.xpath('./tr')
+    if not table.xpath('.//thead//tr'):
+        while body_trs and all(c.tag == 'th' for c in body_trs[0].iterchildren('td', 'th')) \
+                and next(body_trs[0].iterchildren('th'), None) is not None:
+            body_trs.pop(0)
+    body, remainder = _expand_spans(body_trs)
+    footer, _ = _expand_spans(table.xpath('.//tfoot//tr'), remainder)
+    rows = body + footer
+    width = max((len(r) for r in rows), default=0)
+    return [r + [''] * (width - len(r)) for r in rows]
+
+
+def _hidden(el):
+    return 'display:none' in el.get('style', '').replace(' ', '')
+
+
+def displayed_tables(doc):
+    # read_html(displayed_only=True)：跳过 display:none 的表格，并去掉表格内的 <style> 与隐藏元素
+    tables = [t for t in _TABLES_WITH_TEXT(doc) if not _hidden(t)]
+    for table in tables:
+        for el in table.xpath('.//style'):
+            el.drop_tree()
+        for el in table.xpath('.//*[@style]'):
+            if _hidden(el):
+                el.drop_tree()
+    return tables
+
+
+def extract_tables(html, indices=RELEASE_TABLES):
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    doc = lxml_html.fromstring(html, parser=_PARSER)
+    wanted = set(indices)
+    return [table_rows(table) if i in wanted else None for i, table in enumerate(displayed_tables(doc))]
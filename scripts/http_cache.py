@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - HTTP 响应缓存
+
+发布页按内容哈希保存在 data/.cache/http/objects 下，按 URL 建立索引并记录 ETag/Last-Modified。
+再次抓取时发送条件请求（304 直接复用缓存），离线模式完全从缓存回放，
+网络错误和 5xx/429 按指数退避加随机抖动重试。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+from datetime import datetime
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import HTTP_CACHE_DIR
+
+REQUEST_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class OfflineCacheMiss(Exception):
+    pass
+
+
+def _url_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class HttpFetcher:
+    def __init__(self, session=None, cache_dir=HTTP_CACHE_DIR, use_cache=True, offline=False,
+                 retries=3, backoff=1.0, timeout=30):
+        self.session = session or requests.Session()
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.offline = offline
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def _entry_path(self, url):
+        return os.path.join(self.cache_dir, 'index', f'{_url_key(url)}.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest[:2], f'{digest}.html')
+
+    def load_entry(self, url):
+        try:
+            with open(self._entry_path(url), encoding='utf-8') as f:
+                entry = json.load(f)
+            with open(self._object_path(entry['sha256']), 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError, KeyError):
+            return None, None
+        return entry, body
+
+    def store(self, url, response):
+        body = response.content
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            _write_atomic(object_path, body)
+        entry = {'url': url, 'sha256': digest, 'etag': response.headers.get('ETag'),
+                 'last_modified': response.headers.get('Last-Modified'),
+                 'fetched_at': datetime.now().isoformat(timespec='seconds')}
+        _write_atomic(self._entry_path(url), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        return body
+
+    def _get(self, url, headers):
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                reason = type(e).__name__
+            delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"WARNING: {reason} for {url}, retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+    def fetch(self, url):
+        entry, body = self.load_entry(url) if self.use_cache else (None, None)
+        if self.offline:
+            if body is None:
+                raise OfflineCacheMiss(f"No cached copy for {url}")
+            print(f"Replaying cached copy: {url}")
+            return body.decode('utf-8', errors='replace')
+
+        print(f"Fetching data from: {url}")
+        headers = dict(REQUEST_HEADERS)
+        if body is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = self._get(url, headers)
+        if response.status_code == 304 and body is not None:
+            print("Not modified, using cached copy")
+            return body.decode('utf-8', errors='replace')
+        response.raise_for_status()
+        if self.use_cache:
+            body = self.store(url, response)
+        else:
+            body = response.content
+        return body.decode('utf-8', errors='replace')
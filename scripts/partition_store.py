@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 按月分区存储
+
+每个月的数据单独保存为一个 CSV 分区（data/70cityprice.parts/YYYYMM.csv），
+manifest.json 记录各分区的行数与校验和。更新时只写入新增或替换的分区
+（临时文件 + 原子重命名），完整的 70cityprice.csv 按需导出。
+"""
+
+import io
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+try:
+    import numpy as np
+    import pandas as pd
+    HAS_DEPS = True
+except ImportError:
+    HAS_DEPS = False
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CSV_PATH, REQUIRED_COLUMNS
+if HAS_DEPS:
+    from data_store import (month_key, month_from_key, date_to_month_key, file_sha256,
+                            write_json_atomic, INVALID_MONTH)
+
+MANIFEST_VERSION = 1
+INVALID_PARTITION = 'invalid'
+
+
+def partition_dir_for(csv_path=CSV_PATH):
+    return os.path.splitext(os.path.abspath(csv_path))[0] + '.parts'
+
+
+def manifest_path_for(csv_path=CSV_PATH):
+    return os.path.join(partition_dir_for(csv_path), 'manifest.json')
+
+
+def partition_name(key):
+    if key == INVALID_MONTH:
+        return INVALID_PARTITION
+    year, month = month_from_key(key)
+    return f'{year}{month:02d}'
+
+
+def partition_key(name):
+    if name == INVALID_PARTITION:
+        return INVALID_MONTH
+    return month_key(int(name[:4]), int(name[4:6]))
+
+
+def read_manifest(csv_path=CSV_PATH):
+    try:
+        with open(manifest_path_for(csv_path), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def manifest_rows(manifest):
+    return sum(entry['rows'] for entry in manifest['partitions'].values())
+
+
+def sorted_partitions(manifest):
+    return sorted(manifest['partitions'], key=partition_key)
+
+
+def partition_stats(part):
+    # 分区摘要（城市数、各指数类型各列均值），供新月份入库时做连续性检查，无需重读历史分区
+    idx_columns = [c for c in part.columns if c.endswith('IDX')]
+    try:
+        values = part[idx_columns].to_numpy(dtype='float64', na_value=float('nan'))
+    except ValueError:
+        values = part[idx_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+    codes, bases = pd.factorize(part['FixedBase'].astype(str).str.strip())
+    means = {}
+    for i, fb in enumerate(bases):
+        block = values[codes == i]
+        counts = (~np.isnan(block)).sum(axis=0)
+        sums = np.nansum(block, axis=0)
+        means[fb] = {c: round(float(sums[j] / counts[j]), 3) for j, c in enumerate(idx_columns) if counts[j]}
+    return {'cities': int(part['CITY'].nunique()), 'means': means}
+
+
+def partition_stats_for(csv_path, manifest, name):
+    entry = manifest['partitions'].get(name)
+    if entry is None:
+        return None
+    if 'stats' not in entry:
+        part = pd.read_csv(os.path.join(partition_dir_for(csv_path), entry['file']), dtype=str)
+        entry['stats'] = partition_stats(part)
+    return entry['stats']
+
+
+def _write_partition_file(path, df):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    df.to_csv(tmp_path, index=False, quoting=1)
+    checksum = file_sha256(tmp_path)
+    os.replace(tmp_path, path)
+    return checksum
+
+
+def write_partitions(csv_path, df, manifest=None, sources=None):
+    part_dir = partition_dir_for(csv_path)
+    os.makedirs(part_dir, exist_ok=True)
+    if manifest is None:
+        manifest = {'version': MANIFEST_VERSION, 'columns': list(df.columns), 'partitions': {}}
+    df = df.reindex(columns=manifest['columns'])
+
+    date_keys = {d: date_to_month_key(d) for d in df['DATE'].dropna().unique()}
+    keys = df['DATE'].map(date_keys).fillna(INVALID_MONTH).astype(int)
+    for key, part in df.groupby(keys, sort=True):
+        name = partition_name(key)
+        file_name = f'{name}.csv'
+        part = part.sort_values(['CITY', 'FixedBase'], kind='stable')
+        checksum = _write_partition_file(os.path.join(part_dir, file_name), part)
+        manifest['partitions'][name] = {'file': file_name, 'rows': len(part), 'sha256': checksum,
+                                        'stats': partition_stats(part)}
+        if sources and sources.get(name):
+            manifest['partitions'][name]['source_url'] = sources[name]
+
+    manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+    write_json_atomic(manifest_path_for(csv_path), manifest)
+    return manifest
+
+
+def partition_rows(df, columns=REQUIRED_COLUMNS):
+    # write_partitions 写出后再用 read_partitions 读回的内容（文本值，按月份、CITY、FixedBase 排序），不写文件
+    df = df.reindex(columns=columns)
+    keys = df['DATE'].map({d: date_to_month_key(d) for d in df['DATE'].dropna().unique()}).fillna(INVALID_MONTH)
+    df = df.assign(_month=keys.astype(int).to_numpy()).sort_values(['_month', 'CITY', 'FixedBase'], kind='stable')
+    text = df.drop(columns='_month').to_csv(index=False, quoting=1)
+    return pd.read_csv(io.StringIO(text), dtype=str)
+
+
+def bootstrap_partitions(csv_path=CSV_PATH):
+    if os.path.exists(csv_path):
+        df = pd.read_csv(csv_path, dtype=str)
+    else:
+        df = pd.DataFrame(columns=REQUIRED_COLUMNS)
+    return write_partitions(csv_path, df)
+
+
+def read_partitions(csv_path=CSV_PATH, names=None, manifest=None):
+    manifest = manifest or read_manifest(csv_path)
+    part_dir = partition_dir_for(csv_path)
+    names = sorted_partitions(manifest) if names is None else sorted(names, key=partition_key)
+    frames = [pd.read_csv(os.path.join(part_dir, manifest['partitions'][n]['file']), dtype=str) for n in names]
+    if not frames:
+        return pd.DataFrame(columns=manifest['columns'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def export_csv(csv_path=CSV_PATH, output_path=None):
+    manifest = read_manifest(csv_path)
+    if manifest is None:
+        raise ValueError(f"No partition manifest found for {csv_path}")
+    output_path = output_path or csv_path
+    part_dir = partition_dir_for(csv_path)
+    tmp_path = f'{output_path}.tmp{os.getpid()}'
+    names = sorted_partitions(manifest)
+    if not names:
+        pd.DataFrame(columns=manifest['columns']).to_csv(tmp_path, index=False, quoting=1)
+    else:
+        with open(tmp_path, 'wb') as out:
+            for i, name in enumerate(names):
+                with open(os.path.join(part_dir, manifest['partitions'][name]['file']), 'rb') as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header)
+                    out.write(f.read())
+    os.replace(tmp_path, output_path)
+    return manifest_rows(manifest)
+
+
+def verify_partitions(csv_path=CSV_PATH):
+    manifest = read_manifest(csv_path)
+    if manifest is None:
+        return [f"No partition manifest found for {csv_path}"]
+    problems = []
+    part_dir = partition_dir_for(csv_path)
+    for name in sorted_partitions(manifest):
+        path = os.path.join(part_dir, manifest['partitions'][name]['file'])
+        if not os.path.exists(path):
+            problems.append(f"{name}: partition file missing")
+        elif file_sha256(path) != manifest['partitions'][name]['sha256']:
+            problems.append(f"{name}: checksum mismatch")
+    return problems
+
+
+def main():
+    if not HAS_DEPS:
+        print("ERROR: Missing pandas dependency")
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description='70 City House Price Partition Store')
+    subparsers = parser.add_subparsers(dest='command')
+    export_parser = subparsers.add_parser('export', help='Export partitions as one compacted CSV')
+    export_parser.add_argument('--output', '-o', help='Output CSV path (default: main data file)')
+    subparsers.add_parser('verify', help='Verify partition checksums')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        rows = export_csv(CSV_PATH, args.output)
+        print(f"[DONE] Exported {rows} records to: {args.output or CSV_PATH}")
+    elif args.command == 'verify':
+        problems = verify_partitions(CSV_PATH)
+        for text in problems:
+            print(f"[FAIL] {text}")
+        if problems:
+            sys.exit(1)
+        print("[PASS] All partitions match the manifest")
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
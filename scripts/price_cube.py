@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 稠密价格立方体
+
+把长表数据物化为 float32 数组 [城市 × 月份 × 指数类型 × 指数列]，
+保存为 .npy 并以内存映射方式读取，按城市/月份取值均为 O(1) 的切片视图。
+月份轴预留空位，update_price 新增月份时原地写入，无需重建。
+"""
+
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CSV_PATH, CITY_ADCODE, IDX_COLUMNS, normalize_city_name
+from data_store import (read_typed, month_key, month_from_key, cache_dir_for, source_stat,
+                        source_matches, source_fingerprint, file_sha256, write_json_atomic, save_array_atomic)
+from profiling import span
+
+CUBE_VERSION = 1
+CUBE_CITIES = list(CITY_ADCODE)
+CUBE_FIXED_BASE = ['同比', '环比', '定基比']
+MONTH_HEADROOM = 12
+
+_LOADED = {}
+
+
+class PriceCube:
+    def __init__(self, values, start_key, n_months, cities=None, fixedbases=None, columns=None):
+        self.values = values
+        self.start_key = int(start_key)
+        self.n_months = int(n_months)
+        self.cities = list(cities or CUBE_CITIES)
+        self.fixedbases = list(fixedbases or CUBE_FIXED_BASE)
+        self.columns = list(columns or IDX_COLUMNS)
+        self._city_index = {c: i for i, c in enumerate(self.cities)}
+        self._fb_index = {f: i for i, f in enumerate(self.fixedbases)}
+        self._col_index = {c: i for i, c in enumerate(self.columns)}
+
+    @property
+    def months(self):
+        return np.arange(self.start_key, self.start_key + self.n_months)
+
+    @property
+    def end_key(self):
+        return self.start_key + self.n_months - 1
+
+    def city_index(self, city):
+        idx = self._city_index.get(normalize_city_name(city))
+        if idx is None:
+            raise KeyError(f"City not in cube: {city}")
+        return idx
+
+    def month_index(self, month):
+        key = month_key(*month) if isinstance(month, tuple) else int(month)
+        idx = key - self.start_key
+        if not 0 <= idx < self.n_months:
+            raise KeyError(f"Month out of range: {month_from_key(key)}")
+        return idx
+
+    def _month_bounds(self, start_key=None, end_key=None):
+        lo = 0 if start_key is None else min(max(start_key - self.start_key, 0), self.n_months)
+        hi = self.n_months if end_key is None else min(max(end_key - self.start_key + 1, 0), self.n_months)
+        return lo, max(lo, hi)
+
+    def series(self, city, fixedbase, column, start_key=None, end_key=None):
+        lo, hi = self._month_bounds(start_key, end_key)
+        return self.values[self.city_index(city), lo:hi, self._fb_index[fixedbase], self._col_index[column]]
+
+    def slice(self, month):
+        return self.values[:, self.month_index(month)]
+
+    def cities_at(self, month, fixedbase='同比', column='CommodityHouseIDX'):
+        values = self.values[:, self.month_index(month), self._fb_index[fixedbase], self._col_index[column]]
+        return pd.Series(values, index=self.cities, name=column).dropna()
+
+    def frame(self, cities, fixedbase, column, start_key=None, end_key=None):
+        lo, hi = self._month_bounds(start_key, end_key)
+        rows = [self.city_index(c) for c in cities]
+        matrix = self.values[rows, lo:hi, self._fb_index[fixedbase], self._col_index[column]]
+        index = pd.Index(self.start_key + np.arange(lo, hi), name='MONTH')
+        return pd.DataFrame(matrix.T, index=index, columns=[self.cities[r] for r in rows])
+
+    def labels(self):
+        return {'version': CUBE_VERSION, 'start_key': self.start_key, 'n_months': self.n_months,
+                'capacity': int(self.values.shape[1]), 'cities': self.cities,
+                'fixedbases': self.fixedbases, 'columns': self.columns}
+
+
+def _axis_codes(series, index):
+    series = series.astype('category')
+    lookup = [index.get(c, index.get(normalize_city_name(c), -1)) for c in series.cat.categories]
+    return np.array(lookup + [-1], dtype=np.int64)[series.cat.codes.to_numpy()]
+
+
+def _scatter(values, df, start_key, city_index, fb_index, columns):
+    if 'CITY_CODE' in df.columns and list(city_index) == CUBE_CITIES:
+        ci = df['CITY_CODE'].to_numpy().astype(np.int64)
+    else:
+        ci = _axis_codes(df['CITY'], city_index)
+    fi = _axis_codes(df['FixedBase'], fb_index)
+    mi = df['MONTH'].to_numpy().astype(np.int64) - start_key
+    # 不在 70 城表中的城市编码排在城市轴之外，不进入立方体
+    keep = (ci >= 0) & (ci < values.shape[0]) & (fi >= 0) & (mi >= 0) & (mi < values.shape[1])
+    block = np.full((int(keep.sum()), len(columns)), np.nan, dtype=np.float32)
+    for k, col in enumerate(columns):
+        if col in df.columns:
+            block[:, k] = df[col].to_numpy(dtype=np.float32, na_value=np.nan)[keep]
+    values[ci[keep], mi[keep], fi[keep], :] = block
+
+
+def build_cube(df, headroom=MONTH_HEADROOM):
+    months = df['MONTH'].to_numpy()
+    months = months[months >= 0]
+    if len(months) == 0:
+        raise ValueError("No valid month data to build cube")
+    start_key, n_months = int(months.min()), int(months.max() - months.min() + 1)
+    values = np.full((len(CUBE_CITIES), n_months + headroom, len(CUBE_FIXED_BASE), len(IDX_COLUMNS)),
+                     np.nan, dtype=np.float32)
+    cube = PriceCube(values, start_key, n_months)
+    _scatter(values, df, start_key, cube._city_index, cube._fb_index, cube.columns)
+    return cube
+
+
+def _cube_paths(csv_path):
+    cube_dir = cache_dir_for(csv_path, 'cube')
+    return cube_dir, os.path.join(cube_dir, 'values.npy'), os.path.join(cube_dir, 'labels.json')
+
+
+def _read_labels(labels_path):
+    try:
+        with open(labels_path, encoding='utf-8') as f:
+            labels = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return labels if labels.get('version') == CUBE_VERSION else None
+
+
+def save_cube(cube, csv_path=CSV_PATH, source=None):
+    cube_dir, values_path, labels_path = _cube_paths(csv_path)
+    os.makedirs(cube_dir, exist_ok=True)
+    save_array_atomic(values_path, np.ascontiguousarray(cube.values))
+    labels = cube.labels()
+    labels['source'] = source
+    write_json_atomic(labels_path, labels)
+
+
+def load_cube(csv_path=CSV_PATH):
+    source = source_stat(csv_path)
+    loaded = _LOADED.get(csv_path)
+    if loaded is not None and loaded[0] == source_fingerprint(source):
+        return loaded[1]
+    with span('load_cube'):
+        cube = _load_cube_cached(csv_path, source)
+    _LOADED[csv_path] = (source_fingerprint(source), cube)
+    return cube
+
+
+def _load_cube_cached(csv_path, source):
+    _, values_path, labels_path = _cube_paths(csv_path)
+    labels = _read_labels(labels_path)
+    if labels is not None and source_matches(labels.get('source'), csv_path, source):
+        try:
+            values = np.load(values_path, mmap_mode='r')
+            if values.shape[1] == labels['capacity']:
+                return PriceCube(values, labels['start_key'], labels['n_months'],
+                                 labels['cities'], labels['fixedbases'], labels['columns'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    cube = build_cube(read_typed(csv_path))
+    source['sha256'] = file_sha256(source['path'])
+    try:
+        save_cube(cube, csv_path, source)
+    except OSError as e:
+        print(f"WARNING: Cannot write price cube: {e}")
+    return cube
+
+
+def update_cube_month(month_df, previous_source, csv_path=CSV_PATH):
+    # 返回 False 表示无法原地更新，立方体会在下次 load_cube 时整体重建
+    _, values_path, labels_path = _cube_paths(csv_path)
+    labels = _read_labels(labels_path)
+    if labels is None or not source_matches(labels.get('source'), csv_path, previous_source):
+        return False
+    months = month_df['MONTH'].to_numpy()
+    if len(months) == 0 or months.min() != months.max():
+        return False
+    idx = int(months[0]) - labels['start_key']
+    if not 0 <= idx < labels['capacity'] or idx > labels['n_months']:
+        return False
+
+    values = np.load(values_path, mmap_mode='r+')
+    values[:, idx] = np.nan
+    city_index = {c: i for i, c in enumerate(labels['cities'])}
+    fb_index = {f: i for i, f in enumerate(labels['fixedbases'])}
+    _scatter(values, month_df, labels['start_key'], city_index, fb_index, labels['columns'])
+    values.flush()
+    del values
+
+    labels['n_months'] = max(labels['n_months'], idx + 1)
+    labels['source'] = source_stat(csv_path)
+    labels['source']['sha256'] = file_sha256(labels['source']['path'])
+    write_json_atomic(labels_path, labels)
+    return True
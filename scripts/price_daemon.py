@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据查询守护进程
+
+常驻进程预先加载定型数据与价格立方体，在本地套接字（Unix socket，不支持时为 127.0.0.1）上
+执行 extract_price / generate_chart / quick_analysis / yearly_trend 的命令行请求。
+数据文件变化后下一次请求自动重新加载。守护进程未运行时各脚本照常在本进程内执行。
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import importlib
+import threading
+import socketserver
+from contextlib import redirect_stdout, redirect_stderr
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CSV_PATH, DAEMON_SOCKET, DAEMON_PORT
+from daemon_client import NO_DAEMON_ENV, connect, send_request
+
+HAS_UNIX_SOCKET = hasattr(socketserver, 'ThreadingUnixStreamServer')
+SCRIPTS = ('extract_price', 'generate_chart', 'quick_analysis', 'yearly_trend')
+
+
+class PriceDaemon:
+    def __init__(self, csv_path=CSV_PATH):
+        self.csv_path = csv_path
+        self.started_at = time.time()
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.modules = {}
+
+    def warm(self):
+        # 请求中启动的子进程不再转发回守护进程，避免等待守护进程自身持有的锁
+        os.environ[NO_DAEMON_ENV] = '1'
+        os.environ.setdefault('MPLBACKEND', 'Agg')
+        for name in SCRIPTS:
+            self.modules[name] = importlib.import_module(name)
+        from data_store import read_typed, source_path
+        from price_cube import load_cube
+        if os.path.exists(source_path(self.csv_path)):
+            df = read_typed(self.csv_path)
+            load_cube(self.csv_path)
+            print(f"Loaded {len(df)} records from {self.csv_path}")
+
+    def status(self):
+        return {'pid': os.getpid(), 'uptime': round(time.time() - self.started_at, 1),
+                'requests': self.requests, 'scripts': list(self.modules)}
+
+    def run(self, script, argv, cwd):
+        module = self.modules.get(script)
+        if module is None:
+            return {'exit_code': 2, 'output': f"ERROR: Unknown script: {script}\n"}
+        output = io.StringIO()
+        with self.lock:
+            self.requests += 1
+            saved_argv, saved_cwd = sys.argv, os.getcwd()
+            exit_code = 0
+            try:
+                sys.argv = [module.__file__] + list(argv)
+                os.chdir(cwd)
+                with redirect_stdout(output), redirect_stderr(output):
+                    result = module.main()
+                    exit_code = result if isinstance(result, int) else 0
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                if e.code is not None and not isinstance(e.code, int):
+                    output.write(f"{e.code}\n")
+            except Exception as e:
+                output.write(f"ERROR: {type(e).__name__}: {e}\n")
+                exit_code = 1
+            finally:
+                sys.argv = saved_argv
+                os.chdir(saved_cwd)
+                if 'matplotlib.pyplot' in sys.modules:
+                    sys.modules['matplotlib.pyplot'].close('all')
+        return {'exit_code': exit_code, 'output': output.getvalue()}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line.decode('utf-8'))
+        except ValueError:
+            return
+        daemon = self.server.price_daemon
+        command = request.get('command', 'run')
+        if command == 'status':
+            response = daemon.status()
+        elif command == 'shutdown':
+            response = {'exit_code': 0, 'output': 'Daemon stopping\n'}
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            response = daemon.run(request.get('script'), request.get('argv', []), request.get('cwd', os.getcwd()))
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+def make_server(daemon):
+    if HAS_UNIX_SOCKET:
+        if os.path.exists(DAEMON_SOCKET):
+            os.remove(DAEMON_SOCKET)
+        os.makedirs(os.path.dirname(DAEMON_SOCKET), exist_ok=True)
+        server = socketserver.ThreadingUnixStreamServer(DAEMON_SOCKET, _Handler)
+        os.chmod(DAEMON_SOCKET, 0o600)
+    else:
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', DAEMON_PORT), _Handler)
+    server.daemon_threads = True
+    server.price_daemon = daemon
+    return server
+
+
+def serve(csv_path=CSV_PATH):
+    sock = connect()
+    if sock is not None:
+        sock.close()
+        print("ERROR: Daemon is already running")
+        return 1
+    daemon = PriceDaemon(csv_path)
+    daemon.warm()
+    server = make_server(daemon)
+    print(f"Daemon listening on {DAEMON_SOCKET if HAS_UNIX_SOCKET else f'127.0.0.1:{DAEMON_PORT}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if HAS_UNIX_SOCKET and os.path.exists(DAEMON_SOCKET):
+            os.remove(DAEMON_SOCKET)
+    print("[DONE] Daemon stopped")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='70 City House Price Query Daemon')
+    parser.add_argument('command', nargs='?', default='start', choices=['start', 'stop', 'status'],
+                        help='start (foreground), stop or status')
+    args = parser.parse_args()
+
+    if args.command == 'start':
+        return serve(CSV_PATH)
+
+    sock = connect()
+    if sock is None:
+        print("Daemon is not running")
+        return 1
+    if args.command == 'stop':
+        print(send_request(sock, {'command': 'shutdown'})['output'], end='')
+    else:
+        status = send_request(sock, {'command': 'status'})
+        print(f"PID: {status['pid']}")
+        print(f"Uptime: {status['uptime']}s")
+        print(f"Requests served: {status['requests']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
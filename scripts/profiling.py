@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 分阶段计时与性能剖析
+
+命令行脚本用 `--profile [FILE]` 或环境变量 CITYPRICE_PROFILE=FILE 开启（省略 FILE 或为 `-` 时写到标准错误）。
+开启后每个阶段结束时追加一行 JSON：阶段名、上级阶段、墙钟时间、CPU 时间、进程峰值常驻内存、行数等；
+进程结束时再写一行 total。`--profile-pstats FILE`（或 CITYPRICE_PROFILE_PSTATS）另用 cProfile
+记录整个运行并保存为 pstats 文件。
+
+未开启时 span() 直接返回同一个空对象，不计时也不写出。本模块只依赖标准库，各脚本最先导入，
+模块导入时刻作为进程起点，startup 阶段即导入依赖库所用的时间。
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROFILE_ENV = 'CITYPRICE_PROFILE'
+PSTATS_ENV = 'CITYPRICE_PROFILE_PSTATS'
+STDERR = '-'
+
+_STARTED = time.perf_counter()
+_STARTED_CPU = time.process_time()
+_PROFILER = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, **fields):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'fields', 'parent', 'wall', 'cpu')
+
+    def __init__(self, profiler, name, fields):
+        self.profiler = profiler
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        stack = self.profiler.stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.wall, self.cpu = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall, cpu = time.perf_counter() - self.wall, time.process_time() - self.cpu
+        self.profiler.stack().pop()
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        self.profiler.emit(self.name, self.parent, wall, cpu, self.fields)
+        return False
+
+    def record(self, **fields):
+        # 阶段内补充字段，如 rows
+        self.fields.update(fields)
+
+
+class Profiler:
+    def __init__(self, target=STDERR, pstats_path=None):
+        self.target = target
+        self.stream = sys.stderr if target == STDERR else open(target, 'a', encoding='utf-8')
+        self.pstats_path = pstats_path
+        self.pid = os.getpid()
+        self.cprofile = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if pstats_path:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def emit(self, name, parent, wall, cpu, fields):
+        record = {'span': name, 'parent': parent, 'wall_s': round(wall, 6), 'cpu_s': round(cpu, 6),
+                  'peak_rss_mb': peak_rss_mb(), 'pid': os.getpid()}
+        if threading.current_thread() is not threading.main_thread():
+            record['thread'] = threading.current_thread().name
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+    def close(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.pstats_path)
+            self.cprofile = None
+        self.emit('total', None, time.perf_counter() - _STARTED, time.process_time() - _STARTED_CPU,
+                  {'argv': sys.argv[1:]})
+        if self.stream is not sys.stderr:
+            self.stream.close()
+
+
+def enabled():
+    return _PROFILER is not None
+
+
+def span(name, **fields):
+    if _PROFILER is None:
+        return _NULL_SPAN
+    return _Span(_PROFILER, name, fields)
+
+
+def enable(target=STDERR, pstats_path=None, script=None):
+    # 重复调用（如守护进程内多次执行 main）时保持已有的剖析器
+    global _PROFILER
+    if _PROFILER is not None:
+        return _PROFILER
+    _PROFILER = Profiler(target or STDERR, pstats_path)
+    _PROFILER.emit('startup', None, time.perf_counter() - _STARTED, time.process_time() - _STARTED_CPU,
+                   {'script': script} if script else {})
+    atexit.register(_close)
+    return _PROFILER
+
+
+def _close():
+    global _PROFILER
+    profiler, _PROFILER = _PROFILER, None
+    # fork 出的子进程继承了剖析器，只由创建它的进程写出 total
+    if profiler is not None and profiler.pid == os.getpid():
+        profiler.close()
+
+
+def add_profile_args(parser):
+    parser.add_argument('--profile', nargs='?', const=STDERR, metavar='FILE',
+                        help=f"Write per-stage timing as JSON lines to FILE (default: stderr; env {PROFILE_ENV})")
+    parser.add_argument('--profile-pstats', metavar='FILE', help=f"Also save a cProfile pstats dump (env {PSTATS_ENV})")
+
+
+def configure(args=None, script=None):
+    # 命令行参数优先，其次环境变量；fork 出的工作进程（并行校验、批量渲染）沿用同一剖析器，记录带 pid
+    target = getattr(args, 'profile', None) or os.environ.get(PROFILE_ENV)
+    pstats_path = getattr(args, 'profile_pstats', None) or os.environ.get(PSTATS_ENV)
+    if not target and not pstats_path:
+        return None
+    return enable(target, pstats_path, script)
+
+
+def requested(argv=None):
+    # daemon_client 用于判断是否需要在本进程执行
+    argv = sys.argv[1:] if argv is None else argv
+    return bool(os.environ.get(PROFILE_ENV) or os.environ.get(PSTATS_ENV)
+                or any(a.startswith('--profile') for a in argv))
@@ -7,25 +7,26 @@ import sys
 import os
 import argparse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from daemon_client import forward_to_daemon
+if __name__ == '__main__':
+    forward_to_daemon('quick_analysis')
 
 try:
+    import numpy as np
     import pandas as pd
     HAS_DEPS = True
 except ImportError:
     HAS_DEPS = False
 
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import CSV_PATH, OUTPUT_DIR, CITY_ADCODE, normalize_city_name
-
-
-def load_data():
-    if not os.path.exists(CSV_PATH):
-        print(f"ERROR: CSV file not found: {CSV_PATH}")
-        sys.exit(1)
-    print(f"Reading data file: {CSV_PATH}")
-    df = pd.read_csv(CSV_PATH, dtype=str)
-    print(f"Total records: {len(df)}")
-    return df
+from profiling import span, add_profile_args, configure as configure_profiling
+if HAS_DEPS:
+    from data_store import load_data, to_export_frame, month_key, month_slice, filter_cities
+    from price_cube import load_cube
+    from generate_chart import HAS_DEPS as HAS_CHART_DEPS, render_chart
 
 
 def parse_month_arg(month_str):
@@ -36,22 +37,11 @@ def parse_month_arg(month_str):
 
 
 def filter_data(df, cities, start_month, end_month):
-    def date_in_range(date_str):
-        try:
-            parts = date_str.split('/')
-            return (int(parts[0]), int(parts[1]))
-        except:
-            return None
+    start_key = month_key(*parse_month_arg(start_month)) if start_month else None
+    end_key = month_key(*parse_month_arg(end_month)) if end_month else None
+    df = month_slice(df, start_key, end_key)
     
-    if start_month:
-        sy, sm = parse_month_arg(start_month)
-        df = df[df['DATE'].apply(lambda x: date_in_range(x) >= (sy, sm) if date_in_range(x) else False)]
-    if end_month:
-        ey, em = parse_month_arg(end_month)
-        df = df[df['DATE'].apply(lambda x: date_in_range(x) <= (ey, em) if date_in_range(x) else False)]
-    
-    city_norms = {normalize_city_name(c) for c in cities}
-    return df[df['CITY'].apply(lambda x: normalize_city_name(x) in city_norms)]
+    return filter_cities(df, cities)
 
 
 def extract_data(df, cities, start_month, end_month, output_dir):
@@ -62,27 +52,37 @@ def extract_data(df, cities, start_month, end_month, output_dir):
     
     os.makedirs(output_dir, exist_ok=True)
     output_csv = os.path.join(output_dir, f"analysis_{'_'.join(cities[:2])}{'_etc' if len(cities) > 2 else ''}.csv")
-    df_filtered.to_csv(output_csv, index=False)
+    to_export_frame(df_filtered).to_csv(output_csv, index=False)
     print(f"[OK] Data saved: {output_csv}")
     return df_filtered
 
 
-def generate_summary(df, cities):
+def generate_summary(cube, cities, start_key=None, end_key=None):
     print("\n" + "="*50)
     print("Analysis Summary")
     print("="*50)
     for city in cities:
-        city_data = df[df['CITY'] == city]
         print(f"\n[{city}]")
         for fb in ['同比', '环比']:
-            fb_data = city_data[city_data['FixedBase'] == fb]
-            if len(fb_data) > 0:
-                values = fb_data['CommodityHouseIDX'].dropna().astype(float)
-                if len(values) > 0:
-                    latest = values.iloc[-1]
-                    avg = values.mean()
-                    trend = "UP" if latest > 100 else ("DOWN" if latest < 100 else "FLAT")
-                    print(f"  {fb}: latest={latest:.1f}({trend}) avg={avg:.1f}")
+            values = cube.series(city, fb, 'CommodityHouseIDX', start_key, end_key)
+            values = values[~np.isnan(values)]
+            if len(values) > 0:
+                latest = float(values[-1])
+                avg = float(values.mean(dtype=np.float64))
+                trend = "UP" if latest > 100 else ("DOWN" if latest < 100 else "FLAT")
+                print(f"  {fb}: latest={latest:.1f}({trend}) avg={avg:.1f}")
+
+
+def generate_charts(df, cities, output_dir):
+    # 折线图与柱状图并发渲染，直接使用已筛选的数据，不再重新加载
+    jobs = {'line': os.path.join(output_dir, "chart.png"), 'bar': os.path.join(output_dir, "chart_bar.png")}
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = {kind: pool.submit(render_chart, df, cities, '同比', kind, path) for kind, path in jobs.items()}
+    for kind, future in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            print(f"WARNING: {kind} chart failed: {e}")
 
 
 def generate_report(df, cities, start_month, end_month, output_dir):
@@ -114,7 +114,9 @@ def main():
     parser.add_argument('--end', '-e', help='End month (YYYYMM)')
     parser.add_argument('--output', '-o', help='Output directory')
     parser.add_argument('--skip-charts', action='store_true', help='Skip chart generation')
+    add_profile_args(parser)
     args = parser.parse_args()
+    configure_profiling(args, 'quick_analysis')
 
     if not os.path.exists(CSV_PATH):
         print(f"ERROR: CSV file not found")
@@ -144,22 +146,27 @@ def main():
 
     df = load_data()
 
-    df_filtered = extract_data(df, cities, args.start, args.end, output_dir)
+    with span('extract') as sp:
+        df_filtered = extract_data(df, cities, args.start, args.end, output_dir)
+        sp.record(rows=0 if df_filtered is None else len(df_filtered))
     if df_filtered is None:
         sys.exit(1)
 
     if not args.skip_charts:
         print("\nGenerating charts...")
-        chart_script = os.path.join(os.path.dirname(__file__), 'generate_chart.py')
-        cmd = [sys.executable, chart_script, '--cities'] + cities + ['--output', os.path.join(output_dir, f"chart.png")]
-        if args.start:
-            cmd.extend(['--start', args.start])
-        if args.end:
-            cmd.extend(['--end', args.end])
-        os.system(' '.join(cmd))
-
-    generate_summary(df_filtered, cities)
-    generate_report(df_filtered, cities, args.start, args.end, output_dir)
+        if HAS_CHART_DEPS:
+            with span('charts'):
+                generate_charts(df_filtered, cities, output_dir)
+        else:
+            print("WARNING: matplotlib is not installed, skipping charts")
+
+    start_key = month_key(*parse_month_arg(args.start)) if args.start else None
+    end_key = month_key(*parse_month_arg(args.end)) if args.end else None
+    cube = load_cube()
+    with span('summary'):
+        generate_summary(cube, cities, start_key, end_key)
+    with span('report'):
+        generate_report(df_filtered, cities, args.start, args.end, output_dir)
 
     print("\n" + "="*50)
     print("[DONE] Analysis complete!")
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 城市排名
+
+从价格立方体取出 [月份 × 城市] 切片，每个月用 argpartition 选出前/后 k 个城市，
+只对选中的 k 个排序，并给出其在当月全部有数据城市中的百分位。多个月份一次计算。
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from data_store import month_from_key
+
+
+def top_k(values, k, largest=True):
+    # values: [月份 × 城市]；返回每月前 k 个城市的列下标（已排序）与有效标记（当月有数据的城市不足 k 个时为 False）
+    values = np.asarray(values, dtype=np.float64)
+    k = max(0, min(int(k), values.shape[1]))
+    if k == 0:
+        return np.empty((values.shape[0], 0), dtype=np.int64), np.empty((values.shape[0], 0), dtype=bool)
+    keyed = np.where(np.isnan(values), -np.inf, values if largest else -values)
+    part = np.argpartition(-keyed, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(keyed, part, axis=1), axis=1, kind='stable')
+    idx = np.take_along_axis(part, order, axis=1)
+    return idx, np.isfinite(np.take_along_axis(keyed, idx, axis=1))
+
+
+def percentile_ranks(values, idx):
+    # 百分位 = (低于该值的城市数 + 0.5 × 相等的城市数) / 当月有数据的城市数 × 100
+    values = np.asarray(values, dtype=np.float64)
+    picked = np.take_along_axis(values, idx, axis=1)[:, :, None]
+    valid = ~np.isnan(values)[:, None, :]
+    below = ((values[:, None, :] < picked) & valid).sum(axis=2)
+    equal = ((values[:, None, :] == picked) & valid).sum(axis=2)
+    counts = valid.sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (below + 0.5 * equal) / counts * 100.0
+
+
+def latest_month(cube, fixedbase, column):
+    series = cube.values[:, :cube.n_months, cube.fixedbases.index(fixedbase), cube.columns.index(column)]
+    filled = np.nonzero(~np.isnan(series).all(axis=0))[0]
+    return None if len(filled) == 0 else cube.start_key + int(filled[-1])
+
+
+def rank_cities(cube, month_keys, fixedbase='环比', column='CommodityHouseIDX', k=5, largest=True):
+    month_keys = [int(m) for m in month_keys if cube.start_key <= m <= cube.end_key]
+    if not month_keys:
+        return pd.DataFrame(columns=['DATE', 'RANK', 'CITY', column, 'PERCENTILE', 'CITIES'])
+    values = np.asarray(cube.values[:, np.array(month_keys) - cube.start_key,
+                                    cube.fixedbases.index(fixedbase), cube.columns.index(column)],
+                        dtype=np.float64).T
+    idx, valid = top_k(values, k, largest)
+    percentiles = percentile_ranks(values, idx)
+    rows, ranks = np.nonzero(valid)
+    cols = idx[rows, ranks]
+    dates = [f"{y}/{m}/1" for y, m in (month_from_key(month_keys[r]) for r in rows)]
+    return pd.DataFrame({
+        'DATE': dates,
+        'RANK': ranks + 1,
+        'CITY': np.array(cube.cities, dtype=object)[cols],
+        column: values[rows, cols].round(3),
+        'PERCENTILE': percentiles[rows, ranks].round(1),
+        'CITIES': (~np.isnan(values)).sum(axis=1)[rows],
+    })
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 图表渲染缓存
+
+以输入数据切片与全部渲染参数（图表类型、指数类型、尺寸、分辨率、字体、绘图代码）计算指纹，
+渲染结果按指纹保存在 data/.cache/render 下。指纹相同的图表直接复制缓存文件，不再重新绘制。
+缓存总大小有上限，超出时按最近使用时间（文件 mtime，命中时更新）淘汰最旧的文件。
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+from functools import lru_cache
+
+import pandas as pd
+import matplotlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES
+from data_store import file_sha256
+
+
+@lru_cache(maxsize=None)
+def _code_digest(path):
+    return file_sha256(path)
+
+
+class RenderCache:
+    # reuse=False 时总是重新渲染（结果仍写入缓存）
+    def __init__(self, cache_dir=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES, reuse=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.reuse = reuse
+
+    def fingerprint(self, frame, params, renderer):
+        digest = hashlib.sha256()
+        params = dict(params, renderer=_code_digest(renderer), matplotlib=matplotlib.__version__,
+                      fonts=list(matplotlib.rcParams['font.sans-serif']))
+        digest.update(json.dumps(params, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+        digest.update(json.dumps([str(c) for c in frame.columns]).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def _object_path(self, fp, output_path):
+        ext = os.path.splitext(output_path)[1].lower() or '.png'
+        return os.path.join(self.cache_dir, fp[:2], f'{fp}{ext}')
+
+    def fetch(self, fp, output_path):
+        if not self.reuse:
+            return False
+        path = self._object_path(fp, output_path)
+        try:
+            os.utime(path)
+            if os.path.dirname(output_path):
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            shutil.copyfile(path, output_path)
+        except OSError:
+            return False
+        return True
+
+    def store(self, fp, output_path):
+        path = self._object_path(fp, output_path)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp{os.getpid()}'
+            shutil.copyfile(output_path, tmp_path)
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError as e:
+            print(f"WARNING: Cannot write render cache: {e}")
+
+    def evict(self):
+        entries, total = [], 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if '.tmp' in name:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, path))
+                total += st.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
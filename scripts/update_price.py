@@ -6,6 +6,11 @@
 import sys
 import os
 import re
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from profiling import span, add_profile_args, configure as configure_profiling
 
 try:
     import pandas as pd
@@ -15,20 +20,42 @@ try:
 except ImportError:
     HAS_DEPS = False
 
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import CSV_PATH, CITY_ADCODE, REQUIRED_COLUMNS, normalize_city_name, get_city_adcode, get_standard_city_name
+if HAS_DEPS:
+    from data_store import convert_frame, source_stat, date_to_month_key, read_typed
+    from price_cube import update_cube_month
+    from aggregates import update_aggregates
+    from partition_store import (read_manifest, bootstrap_partitions, write_partitions, read_partitions,
+                                 partition_rows, manifest_rows, partition_name, partition_stats, partition_stats_for)
+    from vintage_store import record_vintage
+    from validata_price import validate_month
+    from http_cache import HttpFetcher, REQUEST_HEADERS
+    from html_tables import extract_tables
+
+
+def make_session(pool_size=4):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(REQUEST_HEADERS)
+    return session
 
 
-def fetch_data_from_url(url):
-    print(f"Fetching data from: {url}")
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    response = requests.get(url, headers=headers, timeout=30)
-    response.encoding = 'utf-8'
-    tables = pd.read_html(response.text)
+def fetch_page(url, fetcher=None):
+    return (fetcher or HttpFetcher()).fetch(url)
+
+
+def read_tables(html):
+    tables = extract_tables(html)
     print(f"Successfully read {len(tables)} tables")
     return tables
 
 
+def fetch_data_from_url(url, fetcher=None):
+    return read_tables(fetch_page(url, fetcher))
+
+
 def parse_date_from_url(url):
     match = re.search(r't(\d{8})', url)
     if match:
@@ -36,47 +63,67 @@ def parse_date_from_url(url):
     return None, None
 
 
+def release_data_date(url):
+    year, month = parse_date_from_url(url)
+    if not year:
+        raise ValueError(f"Cannot parse date from URL: {url}")
+    data_month = month - 1
+    data_year = year
+    if data_month == 0:
+        data_month = 12
+        data_year -= 1
+    return f"{data_year}/{data_month}/1", data_month == 1
+
+
+def table_as_rows(table):
+    if isinstance(table, pd.DataFrame):
+        return table.astype(object).values.tolist()
+    return table
+
+
 def parse_main_index_table(table, start_row=2, end_row=37, is_january=False):
     data = {}
-    sample_row = table.iloc[start_row] if len(table) > start_row else None
+    table = table_as_rows(table)
+    sample_row = table[start_row] if len(table) > start_row else None
     has_avg = sample_row is not None and (len(sample_row) > 6 or (not is_january and len(sample_row) > 4))
     
     for i in range(start_row, min(end_row, len(table))):
-        row = table.iloc[i]
-        city1 = normalize_city_name(str(row.iloc[0]))
+        row = table[i]
+        city1 = normalize_city_name(str(row[0]))
         if city1 and city1 != 'nan':
             if has_avg:
-                data[city1] = {'环比': row.iloc[1], '同比': row.iloc[2], '定基比': row.iloc[3]}
+                data[city1] = {'环比': row[1], '同比': row[2], '定基比': row[3]}
             else:
-                tongbi_val = row.iloc[2]
-                data[city1] = {'环比': row.iloc[1], '同比': tongbi_val, '定基比': tongbi_val}
+                tongbi_val = row[2]
+                data[city1] = {'环比': row[1], '同比': tongbi_val, '定基比': tongbi_val}
         
         right_start = 4 if has_avg else 3
         if len(row) > right_start:
-            city2 = normalize_city_name(str(row.iloc[right_start]))
+            city2 = normalize_city_name(str(row[right_start]))
             if city2 and city2 != 'nan':
                 if has_avg:
-                    data[city2] = {'环比': row.iloc[right_start + 1], '同比': row.iloc[right_start + 2], '定基比': row.iloc[right_start + 3]}
+                    data[city2] = {'环比': row[right_start + 1], '同比': row[right_start + 2], '定基比': row[right_start + 3]}
                 else:
-                    tongbi_val = row.iloc[right_start + 2]
-                    data[city2] = {'环比': row.iloc[right_start + 1], '同比': tongbi_val, '定基比': tongbi_val}
+                    tongbi_val = row[right_start + 2]
+                    data[city2] = {'环比': row[right_start + 1], '同比': tongbi_val, '定基比': tongbi_val}
     return data
 
 
 def parse_size_index_table(table, start_row=3, end_row=38, is_january=False):
     data = {}
-    sample_row = table.iloc[start_row] if len(table) > start_row else None
+    table = table_as_rows(table)
+    sample_row = table[start_row] if len(table) > start_row else None
     has_avg = sample_row is not None and len(sample_row) >= 10
     
     for i in range(start_row, min(end_row, len(table))):
-        row = table.iloc[i]
-        city = normalize_city_name(str(row.iloc[0]))
+        row = table[i]
+        city = normalize_city_name(str(row[0]))
         if city and city != 'nan':
             if has_avg:
                 data[city] = {
-                    'Below90': {'环比': row.iloc[1], '同比': row.iloc[2], '定基比': row.iloc[3]},
-                    '144': {'环比': row.iloc[4], '同比': row.iloc[5], '定基比': row.iloc[6]},
-                    'Above144': {'环比': row.iloc[7], '同比': row.iloc[8], '定基比': row.iloc[9]}
+                    'Below90': {'环比': row[1], '同比': row[2], '定基比': row[3]},
+                    '144': {'环比': row[4], '同比': row[5], '定基比': row[6]},
+                    'Above144': {'环比': row[7], '同比': row[8], '定基比': row[9]}
                 }
     return data
 
@@ -115,24 +162,153 @@ def create_records(date_str, commodity_main, secondhand_main, commodity_size, se
     return records
 
 
-def update_csv(csv_path, new_records):
-    if os.path.exists(csv_path):
-        existing_df = pd.read_csv(csv_path, dtype=str)
-    else:
-        existing_df = pd.DataFrame(columns=REQUIRED_COLUMNS)
-    print(f"Existing data: {len(existing_df)} records")
-    new_df = pd.DataFrame(new_records)
-    if len(new_records) > 0:
-        new_date = new_records[0]['DATE']
-        if new_date in existing_df['DATE'].values:
-            print(f"WARNING: Data for {new_date} already exists, will replace")
-            existing_df = existing_df[existing_df['DATE'] != new_date]
-    combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-    combined_df = combined_df[REQUIRED_COLUMNS]
-    combined_df['DATE_SORT'] = pd.to_datetime(combined_df['DATE'], format='%Y/%m/%d', errors='coerce')
-    combined_df = combined_df.sort_values(['CITY', 'DATE_SORT', 'FixedBase']).drop('DATE_SORT', axis=1)
-    combined_df.to_csv(csv_path, index=False, quoting=1)
-    print(f"Updated data: {len(combined_df)} records")
+def parse_release(url, html):
+    date_str, is_january = release_data_date(url)
+    commodity_main, secondhand_main, commodity_size, secondhand_size = process_tables(read_tables(html), is_january)
+    return date_str, create_records(date_str, commodity_main, secondhand_main, commodity_size, secondhand_size)
+
+
+def validate_new_months(csv_path, manifest, new_df):
+    # 逐月校验新数据，上月摘要取自本批已通过的月份或清单，不读取历史数据；返回通过与拒绝的分区名
+    date_keys = {d: date_to_month_key(d) for d in new_df['DATE'].unique()}
+    keys = new_df['DATE'].map(date_keys)
+    accepted, rejected, batch_stats = [], [], {}
+    for key in sorted(set(keys)):
+        name = partition_name(key)
+        month_df = new_df[keys == key]
+        previous = None
+        if key >= 0:
+            prev_name = partition_name(key - 1)
+            previous = batch_stats.get(prev_name) or partition_stats_for(csv_path, manifest, prev_name)
+        issues, warnings = validate_month(month_df, previous)
+        for text in warnings:
+            print(f"WARNING: {name}: {text}")
+        if issues:
+            print(f"ERROR: Rejected data for {name}, not written:")
+            for text in issues:
+                print(f"  - {text}")
+            rejected.append(name)
+            continue
+        batch_stats[name] = partition_stats(month_df)
+        accepted.append(name)
+    return accepted, rejected
+
+
+def update_csv(csv_path, new_records, sources=None, validate=True):
+    manifest = read_manifest(csv_path)
+    if manifest is None:
+        with span('bootstrap_partitions'):
+            manifest = bootstrap_partitions(csv_path)
+        print(f"Split data into {len(manifest['partitions'])} monthly partitions")
+    previous_source = source_stat(csv_path)
+    print(f"Existing data: {manifest_rows(manifest)} records")
+    if len(new_records) == 0:
+        return []
+
+    new_df = pd.DataFrame(new_records, columns=REQUIRED_COLUMNS)
+    rejected = []
+    if validate:
+        with span('validate', rows=len(new_df)):
+            accepted, rejected = validate_new_months(csv_path, manifest, new_df)
+        names = new_df['DATE'].map(lambda d: partition_name(date_to_month_key(d)))
+        new_df = new_df[names.isin(accepted)]
+        if new_df.empty:
+            return rejected
+    typed_df = convert_frame(new_df)
+    names = [partition_name(key) for key in sorted(set(typed_df['MONTH']))]
+    replaced = [name for name in names if name in manifest['partitions']]
+    for name in replaced:
+        print(f"WARNING: Data for {name} already exists, will replace (previous values kept in the vintage history)")
+    # 先把本次变化记录为一个新版本（只保存变化的单元格），再替换分区：写入中断时旧值已在版本历史中
+    with span('record_vintage'):
+        old_rows = read_partitions(csv_path, names=replaced, manifest=manifest)
+        vintage = record_vintage(csv_path, old_rows, partition_rows(new_df, manifest['columns']), sources, manifest)
+    if vintage:
+        print(f"Recorded vintage {vintage['id']}: {vintage['cells']} changed cells")
+    with span('write_partitions', rows=len(new_df)):
+        manifest = write_partitions(csv_path, new_df, manifest, sources)
+    print(f"Updated data: {manifest_rows(manifest)} records")
+    with span('update_cube'):
+        cube_updated = update_cube_month(typed_df, previous_source, csv_path)
+    if cube_updated:
+        print("Price cube updated in place")
+    # 刷新加载缓存与元信息清单（只重新解析变化的分区）
+    with span('refresh_cache') as sp:
+        sp.record(rows=len(read_typed(csv_path)))
+    with span('update_aggregates'):
+        aggregates_updated = update_aggregates(set(typed_df['MONTH']), previous_source, csv_path)
+    if aggregates_updated:
+        print("Yearly/quarterly aggregates updated")
+    return rejected
+
+
+def read_url_list(path):
+    with open(path, encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def manifest_urls(csv_path=CSV_PATH):
+    manifest = read_manifest(csv_path)
+    if manifest is None:
+        return []
+    entries = manifest['partitions'].values()
+    return sorted({e['source_url'] for e in entries if e.get('source_url')})
+
+
+def ingest_urls(urls, csv_path=CSV_PATH, workers=4, fetcher=None, validate=True):
+    results = {url: (False, 'not processed') for url in urls}
+    parsed = {}
+    fetcher = fetcher or HttpFetcher(make_session(workers))
+    with span('fetch_parse', urls=len(urls)), ThreadPoolExecutor(max_workers=workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=min(workers, os.cpu_count() or 1)) as parse_pool:
+        fetches = {fetch_pool.submit(fetch_page, url, fetcher): url for url in urls}
+        parses = {}
+        for future in as_completed(fetches):
+            url = fetches[future]
+            try:
+                parses[parse_pool.submit(parse_release, url, future.result())] = url
+            except Exception as e:
+                results[url] = (False, f"fetch failed: {e}")
+        for future in as_completed(parses):
+            url = parses[future]
+            try:
+                parsed[url] = future.result()
+            except Exception as e:
+                results[url] = (False, f"parse failed: {e}")
+
+    records, sources = [], {}
+    for url in urls:
+        if url not in parsed:
+            continue
+        date_str, url_records = parsed[url]
+        if not url_records:
+            results[url] = (False, "no records parsed")
+            continue
+        name = partition_name(date_to_month_key(date_str))
+        if name in sources:
+            print(f"WARNING: {url} repeats data for {date_str}, replacing {sources[name]}")
+            records = [r for r in records if r['DATE'] != date_str]
+            results[sources[name]] = (True, f"{date_str}: superseded by {url}")
+        records.extend(url_records)
+        sources[name] = url
+        results[url] = (True, f"{date_str}: {len(url_records)} records")
+
+    if records:
+        with span('update_csv', rows=len(records)):
+            rejected = update_csv(csv_path, records, sources, validate)
+        for name in rejected:
+            results[sources[name]] = (False, f"{name}: rejected by validation")
+    return results
+
+
+def print_batch_summary(results):
+    print('\n================ BATCH SUMMARY ================')
+    for url, (ok, message) in results.items():
+        print(f"[{'OK' if ok else 'FAIL'}] {url} - {message}")
+    succeeded = sum(1 for ok, _ in results.values() if ok)
+    print(f"Succeeded: {succeeded}, Failed: {len(results) - succeeded}")
+    return succeeded == len(results)
 
 
 def search_latest_url():
@@ -145,16 +321,38 @@ def main():
         print("ERROR: Missing dependencies. Run: pip install pandas requests beautifulsoup4 lxml")
         sys.exit(1)
 
-    url = None
-    auto_mode = False
+    parser = argparse.ArgumentParser(description='70 City House Price Data Updater')
+    parser.add_argument('url', nargs='?', help='NBS release page URL')
+    parser.add_argument('--auto', action='store_true', help='Search for the latest release (default)')
+    parser.add_argument('--batch', metavar='URLS_TXT', help='File with one release URL per line')
+    parser.add_argument('--from-manifest', action='store_true', help='Re-ingest every release URL recorded in the partition manifest')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent fetch/parse workers for batch mode')
+    parser.add_argument('--offline', action='store_true', help='Parse only from cached release pages, no network')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the HTTP response cache')
+    parser.add_argument('--retries', type=int, default=3, help='Retries on network errors and 5xx/429')
+    parser.add_argument('--backoff', type=float, default=1.0, help='Base backoff in seconds (exponential, jittered)')
+    parser.add_argument('--no-validate', action='store_true', help='Write new months without validating them first')
+    add_profile_args(parser)
+    args = parser.parse_args()
+    configure_profiling(args, 'update_price')
+    workers = max(1, args.workers)
+    fetcher = HttpFetcher(make_session(workers), use_cache=not args.no_cache, offline=args.offline,
+                          retries=max(0, args.retries), backoff=args.backoff)
+
+    if args.batch or args.from_manifest:
+        urls = read_url_list(args.batch) if args.batch else manifest_urls(CSV_PATH)
+        if not urls:
+            print("ERROR: No release URLs to ingest")
+            sys.exit(1)
+        print(f"Batch mode: {len(urls)} URLs, {args.workers} workers")
+        results = ingest_urls(urls, CSV_PATH, workers=workers, fetcher=fetcher, validate=not args.no_validate)
+        if not print_batch_summary(results):
+            sys.exit(1)
+        print("[DONE] Batch update complete!")
+        return
 
-    if len(sys.argv) >= 2:
-        if sys.argv[1] == '--auto':
-            auto_mode = True
-        else:
-            url = sys.argv[1]
-    elif len(sys.argv) == 1:
-        auto_mode = True
+    url = args.url
+    auto_mode = args.auto or not url
 
     if auto_mode:
         print("Auto mode: Searching for latest data...")
@@ -166,28 +364,23 @@ def main():
         sys.exit(1)
 
     try:
-        tables = fetch_data_from_url(url)
-        year, month = parse_date_from_url(url)
-        if not year:
-            print("ERROR: Cannot parse date")
-            sys.exit(1)
-        
-        data_month = month - 1
-        data_year = year
-        if data_month == 0:
-            data_month = 12
-            data_year -= 1
-        
-        date_str = f"{data_year}/{data_month}/1"
+        with span('fetch'):
+            html = fetch_page(url, fetcher)
+        date_str, is_january = release_data_date(url)
         print(f"Data date: {date_str}")
         
-        is_january = (data_month == 1)
-        commodity_main, secondhand_main, commodity_size, secondhand_size = process_tables(tables, is_january)
+        with span('parse'):
+            tables = read_tables(html)
+            commodity_main, secondhand_main, commodity_size, secondhand_size = process_tables(tables, is_january)
         
         print(f"Parsed {len(commodity_main)} cities")
         records = create_records(date_str, commodity_main, secondhand_main, commodity_size, secondhand_size)
         print(f"Generated {len(records)} records")
-        update_csv(CSV_PATH, records)
+        with span('update_csv', rows=len(records)):
+            rejected = update_csv(CSV_PATH, records, {partition_name(date_to_month_key(date_str)): url},
+                                  not args.no_validate)
+        if rejected:
+            sys.exit(1)
         print("[DONE] Data update complete!")
         
     except Exception as e:
@@ -6,16 +6,34 @@
 import sys
 import os
 import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from profiling import span, add_profile_args, configure as configure_profiling
+
 try:
+    import numpy as np
     import pandas as pd
     HAS_DEPS = True
 except ImportError:
     HAS_DEPS = False
 
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from config import CSV_PATH, REQUIRED_COLUMNS, ALLOWED_FIXED_BASE, REQUIRED_FIXED_BASE, EXPECTED_CITY_COUNT, normalize_city_name
+from config import (CSV_PATH, REQUIRED_COLUMNS, ALLOWED_FIXED_BASE, REQUIRED_FIXED_BASE, EXPECTED_CITY_COUNT,
+                    IDX_COLUMNS, CITY_ADCODE, resolve_city_code)
+if HAS_DEPS:
+    from data_store import normalize_city_series, month_from_key, INVALID_MONTH
+    from partition_store import read_manifest, partition_dir_for, sorted_partitions, partition_stats
+    from chain_index import implied_yoy, YOY_TOLERANCE
+
+CHUNK_ROWS = 20000
+FIXED_BASE_ORDER = ['同比', '环比', '定基比']
+# 各指数类型的合理取值范围（上年同月/上月/基期 = 100）
+IDX_RANGE = {'同比': (50.0, 150.0), '环比': (80.0, 120.0), '定基比': (20.0, 400.0)}
+SAMPLE_LIMIT = 50
+# 新月份与上月相比，各列全国均值允许的最大变动（指数点）；定基比 在基期调整时会整体跳变，不做比较
+CONTINUITY_LIMIT = {'同比': 5.0, '环比': 3.0}
 
 
 def limit_join(items: List[str], max_items: int = 8) -> str:
@@ -30,58 +48,308 @@ def non_empty_mask(series):
     return series.notna() & (series.astype(str).str.strip() != '')
 
 
-def validate_csv(csv_path: str, max_details: int = 8) -> int:
-    issues: List[str] = []
-    warnings: List[str] = []
+def _add_samples(samples, values):
+    for value in values:
+        if len(samples) >= SAMPLE_LIMIT:
+            break
+        samples.append(value)
+
+
+def check_chunk(df):
+    # 对一个数据块做全部逐行检查，只返回紧凑的汇总状态，由 ValidationState 合并
+    n = len(df)
+    result = {'rows': n, 'columns': list(df.columns)}
+    if any(c not in df.columns for c in REQUIRED_COLUMNS):
+        return result
+
+    date_codes, date_uniques = pd.factorize(df['DATE'])
+    parsed = pd.to_datetime(pd.Series(date_uniques, dtype=object), format='%Y/%m/%d', errors='coerce')
+    unique_keys = np.where(parsed.isna(), INVALID_MONTH, parsed.dt.year * 12 + parsed.dt.month - 1)
+    months = np.append(unique_keys, INVALID_MONTH).astype(np.int64)[date_codes]
+    result['invalid_dates'] = sorted(str(d) for d in date_uniques[parsed.isna().to_numpy()])
+    result['months'] = sorted(int(k) for k in set(unique_keys.tolist()) - {INVALID_MONTH})
+
+    fixed_base = df['FixedBase'].astype(str).str.strip()
+    result['invalid_fixed_base'] = sorted((set(fixed_base.unique()) - ALLOWED_FIXED_BASE) - {'nan'})
+    fb_slot = fixed_base.map({f: i for i, f in enumerate(FIXED_BASE_ORDER)}).fillna(-1).to_numpy(dtype=np.int64)
+
+    city_std = normalize_city_series(df['CITY'])
+    city_codes, city_uniques = pd.factorize(city_std)
+    lookup = np.array([resolve_city_code(c) for c in city_uniques] + [-1], dtype=np.int64)
+    codes = lookup[city_codes]
+    result['city_counts'] = Counter({str(c): int(k) for c, k in zip(city_uniques, np.bincount(city_codes[city_codes >= 0], minlength=len(city_uniques)))})
+
+    # 主键 (月份, 城市, 指数类型)：已知城市按月份记入 [城市 × 指数类型] 计数数组，其余少量行单独计数
+    known = (months >= 0) & (codes >= 0) & (fb_slot >= 0)
+    key_counts = {}
+    for key in np.unique(months[known]):
+        sel = known & (months == key)
+        counts = np.zeros((len(CITY_ADCODE), len(FIXED_BASE_ORDER)), dtype=np.int32)
+        np.add.at(counts, (codes[sel], fb_slot[sel]), 1)
+        key_counts[int(key)] = counts
+    result['key_counts'] = key_counts
+    other = ~known
+    result['other_keys'] = Counter(zip(df['DATE'].astype(str)[other], city_std.astype(str)[other], fixed_base[other]))
+
+    # *IDX 列：可解析性与取值范围（向量化），同比/环比 数值按 [城市 × 指数类型 × 列] 保存供一致性检查
+    lo = np.array([IDX_RANGE[f][0] for f in FIXED_BASE_ORDER] + [-np.inf])[fb_slot]
+    hi = np.array([IDX_RANGE[f][1] for f in FIXED_BASE_ORDER] + [np.inf])[fb_slot]
+    idx_stats = {}
+    values = np.full((n, len(IDX_COLUMNS)), np.nan)
+    for j, col in enumerate(c for c in IDX_COLUMNS if c in df.columns):
+        raw = df[col]
+        present = non_empty_mask(raw).to_numpy()
+        numeric = pd.to_numeric(raw.where(present), errors='coerce').to_numpy(dtype=np.float64)
+        unparseable = present & np.isnan(numeric)
+        out_of_range = ~np.isnan(numeric) & ((numeric < lo) | (numeric > hi))
+        stats = {'unparseable': int(unparseable.sum()), 'out_of_range': int(out_of_range.sum()),
+                 'unparseable_samples': [], 'range_samples': []}
+        _add_samples(stats['unparseable_samples'], (f"{d}|{c}|{f}={v}" for d, c, f, v in
+                     zip(df['DATE'][unparseable], city_std[unparseable], fixed_base[unparseable], raw[unparseable])))
+        _add_samples(stats['range_samples'], (f"{d}|{c}|{f}={v:g}" for d, c, f, v in
+                     zip(df['DATE'][out_of_range], city_std[out_of_range], fixed_base[out_of_range], numeric[out_of_range])))
+        idx_stats[col] = stats
+        values[:, j] = numeric
+    result['idx'] = idx_stats
+
+    series = {}
+    chain = known & (fb_slot <= 1)
+    for key in np.unique(months[chain]):
+        sel = chain & (months == key)
+        block = np.full((len(CITY_ADCODE), 2, len(IDX_COLUMNS)), np.nan, dtype=np.float32)
+        block[codes[sel], fb_slot[sel]] = values[sel]
+        series[int(key)] = block
+    result['series'] = series
+    return result
+
+
+def check_files(paths):
+    return check_chunk(pd.concat([pd.read_csv(path, dtype=str) for path in paths], ignore_index=True))
+
+
+class ValidationState:
+    def __init__(self):
+        self.rows = 0
+        self.columns = None
+        self.month_bits = 0
+        self.invalid_dates = set()
+        self.invalid_fixed_base = set()
+        self.city_counts = Counter()
+        self.key_counts = {}
+        self.other_keys = Counter()
+        self.idx = {}
+        self.series = {}
+
+    def add(self, result):
+        self.rows += result['rows']
+        if self.columns is None:
+            self.columns = result['columns']
+        if 'months' not in result:
+            return
+        for key in result['months']:
+            self.month_bits |= 1 << key
+        self.invalid_dates.update(result['invalid_dates'])
+        self.invalid_fixed_base.update(result['invalid_fixed_base'])
+        self.city_counts.update(result['city_counts'])
+        for key, counts in result['key_counts'].items():
+            if key in self.key_counts:
+                self.key_counts[key] += counts
+            else:
+                self.key_counts[key] = counts
+        self.other_keys.update(result['other_keys'])
+        for col, stats in result['idx'].items():
+            total = self.idx.setdefault(col, {'unparseable': 0, 'out_of_range': 0,
+                                              'unparseable_samples': [], 'range_samples': []})
+            total['unparseable'] += stats['unparseable']
+            total['out_of_range'] += stats['out_of_range']
+            _add_samples(total['unparseable_samples'], stats['unparseable_samples'])
+            _add_samples(total['range_samples'], stats['range_samples'])
+        for key, block in result['series'].items():
+            if key in self.series:
+                self.series[key] = np.where(np.isnan(self.series[key]), block, self.series[key])
+            else:
+                self.series[key] = block
+
+    def months(self):
+        bits, key, months = self.month_bits, 0, []
+        while bits:
+            if bits & 1:
+                months.append(key)
+            bits >>= 1
+            key += 1
+        return months
+
+    def duplicate_keys(self):
+        cities = list(CITY_ADCODE)
+        duplicates = []
+        for key in sorted(self.key_counts):
+            year, month = month_from_key(key)
+            for c, f in zip(*np.nonzero(self.key_counts[key] > 1)):
+                duplicates.append(f"{year}/{month}/1|{cities[c]}|{FIXED_BASE_ORDER[f]}")
+        duplicates.extend('|'.join(k) for k, count in self.other_keys.items() if count > 1)
+        return duplicates
 
-    if not os.path.exists(csv_path):
+    def inconsistencies(self):
+        # 同比 应与最近 12 个月环比的连乘结果一致（舍入误差在容差内）
+        if not self.series:
+            return 0, []
+        first, last = min(self.series), max(self.series)
+        if last - first < 11:
+            return 0, []
+        cube = np.full((last - first + 1, len(CITY_ADCODE), 2, len(IDX_COLUMNS)), np.nan)
+        for key, block in self.series.items():
+            cube[key - first] = block
+        implied = implied_yoy(cube[:, :, 1], axis=0)
+        reported = cube[:, :, 0]
+        with np.errstate(invalid='ignore'):
+            bad = np.abs(reported - implied) > YOY_TOLERANCE
+        cities = list(CITY_ADCODE)
+        samples = []
+        for t, c, j in zip(*np.nonzero(bad)):
+            if len(samples) >= SAMPLE_LIMIT:
+                break
+            year, month = month_from_key(first + t)
+            samples.append(f"{year}/{month} {cities[c]} {IDX_COLUMNS[j]} 同比={reported[t, c, j]:.1f} 环比连乘={implied[t, c, j]:.1f}")
+        return int(bad.sum()), samples
+
+    def report(self, max_details=8):
+        issues: List[str] = []
+        warnings: List[str] = []
+
+        missing_columns = [c for c in REQUIRED_COLUMNS if c not in (self.columns or [])]
+        if missing_columns:
+            issues.append(f"Missing required columns: {', '.join(missing_columns)}")
+            return issues, warnings
+
+        if self.invalid_dates:
+            issues.append(f"Invalid DATE values: {limit_join(sorted(self.invalid_dates), max_details)}")
+
+        valid_months = self.months()
+        if not valid_months:
+            issues.append('No usable month data detected')
+        else:
+            gaps = []
+            for prev, curr in zip(valid_months[:-1], valid_months[1:]):
+                if curr - prev != 1:
+                    (py, pm), (cy, cm) = month_from_key(prev), month_from_key(curr)
+                    gaps.append(f'{py}-{pm:02d}->{cy}-{cm:02d}')
+            if gaps:
+                issues.append(f"Non-continuous months: {limit_join(gaps, max_details)}")
+
+        if self.invalid_fixed_base:
+            issues.append(f"Invalid FixedBase values: {', '.join(sorted(self.invalid_fixed_base))}")
+
+        city_set = {c for c in self.city_counts if c and c != 'None'}
+        if len(city_set) != EXPECTED_CITY_COUNT:
+            issues.append(f"Abnormal city count after standardization: actual={len(city_set)}, expected={EXPECTED_CITY_COUNT}")
+
+        duplicates = self.duplicate_keys()
+        if duplicates:
+            issues.append(f"Duplicate primary keys: {limit_join(duplicates, max_details)}")
+
+        for col in IDX_COLUMNS:
+            stats = self.idx.get(col)
+            if stats is None:
+                continue
+            if stats['unparseable']:
+                issues.append(f"{col}: {stats['unparseable']} non-numeric values: "
+                              f"{limit_join(stats['unparseable_samples'], max_details)}")
+            if stats['out_of_range']:
+                issues.append(f"{col}: {stats['out_of_range']} values outside plausible range: "
+                              f"{limit_join(stats['range_samples'], max_details)}")
+
+        count, samples = self.inconsistencies()
+        if count:
+            warnings.append(f"同比/环比 inconsistent (|同比 - 12-month compounded 环比| > {YOY_TOLERANCE}) "
+                            f"in {count} cases: {limit_join(samples, max_details)}")
+        return issues, warnings
+
+
+def validate_month(df, previous=None, max_details: int = 8):
+    # 入库前只校验新到的一个月（约 70×3 行）；previous 为上月分区摘要（partition_stats）
+    state = ValidationState()
+    result = check_chunk(df)
+    state.add(result)
+    issues, warnings = state.report(max_details)
+    if 'months' not in result:
+        return issues, warnings
+
+    if len(result['months']) > 1:
+        issues.append(f"Expected a single month, got {len(result['months'])}")
+    for key, counts in result['key_counts'].items():
+        cities = list(CITY_ADCODE)
+        for fb in sorted(REQUIRED_FIXED_BASE):
+            missing = [cities[c] for c in np.nonzero(counts[:, FIXED_BASE_ORDER.index(fb)] == 0)[0]]
+            if missing:
+                issues.append(f"Missing {fb} rows for {len(missing)} cities: {limit_join(missing, max_details)}")
+
+    if previous is None:
+        warnings.append('No previous month in the dataset, continuity not checked')
+        return issues, warnings
+    current = partition_stats(df)
+    jumps = []
+    for fb, limit in CONTINUITY_LIMIT.items():
+        before, after = previous['means'].get(fb, {}), current['means'].get(fb, {})
+        for col in IDX_COLUMNS:
+            if col in before and col in after and abs(after[col] - before[col]) > limit:
+                jumps.append(f"{fb} {col} mean {before[col]:.1f}->{after[col]:.1f}")
+    if jumps:
+        issues.append(f"Discontinuous with previous month (limit 同比 ±{CONTINUITY_LIMIT['同比']:g}, "
+                      f"环比 ±{CONTINUITY_LIMIT['环比']:g}): {limit_join(jumps, max_details)}")
+    return issues, warnings
+
+
+def _partition_batches(csv_path, chunk_rows):
+    # 分区按顺序合并为约 chunk_rows 行的批次，每批作为一个数据块检查
+    manifest = read_manifest(csv_path)
+    if manifest is None:
+        return None
+    part_dir = partition_dir_for(csv_path)
+    batches, batch, rows = [], [], 0
+    for name in sorted_partitions(manifest):
+        entry = manifest['partitions'][name]
+        batch.append(os.path.join(part_dir, entry['file']))
+        rows += entry['rows']
+        if rows >= chunk_rows:
+            batches.append(batch)
+            batch, rows = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def validate_csv(csv_path: str, max_details: int = 8, jobs: int = 1, chunk_rows: int = CHUNK_ROWS) -> int:
+    batches = _partition_batches(csv_path, chunk_rows)
+    if batches is None and not os.path.exists(csv_path):
         print(f'ERROR: CSV file not found: {csv_path}')
         return 1
 
     print(f'Starting validation: {csv_path}')
-    df = pd.read_csv(csv_path, dtype=str)
-    print(f'Records: {len(df)}')
-
-    missing_columns = [c for c in REQUIRED_COLUMNS if c not in df.columns]
-    if missing_columns:
-        issues.append(f"Missing required columns: {', '.join(missing_columns)}")
-    if missing_columns:
-        return print_report(issues, warnings)
-
-    date_parsed = pd.to_datetime(df['DATE'], format='%Y/%m/%d', errors='coerce')
-    invalid_dates = sorted(df.loc[date_parsed.isna(), 'DATE'].dropna().astype(str).unique().tolist())
-    if invalid_dates:
-        issues.append(f"Invalid DATE values: {limit_join(invalid_dates, max_details)}")
-
-    month_series = date_parsed.dt.to_period('M')
-    valid_months = sorted(month_series.dropna().unique())
-    if not valid_months:
-        issues.append('No usable month data detected')
-    else:
-        gaps = []
-        for prev, curr in zip(valid_months[:-1], valid_months[1:]):
-            month_delta = (curr.year - prev.year) * 12 + (curr.month - prev.month)
-            if month_delta != 1:
-                gaps.append(f'{prev}->{curr}')
-        if gaps:
-            issues.append(f"Non-continuous months: {limit_join(gaps, max_details)}")
-
-    fixed_base_series = df['FixedBase'].astype(str).str.strip()
-    invalid_fixed_base = sorted((set(fixed_base_series.unique()) - ALLOWED_FIXED_BASE) - {'nan'})
-    if invalid_fixed_base:
-        issues.append(f"Invalid FixedBase values: {', '.join(invalid_fixed_base)}")
-
-    city_std = df['CITY'].apply(normalize_city_name)
-    city_set = set(city_std.dropna().astype(str).str.strip().tolist())
-    if len(city_set) != EXPECTED_CITY_COUNT:
-        issues.append(f"Abnormal city count after standardization: actual={len(city_set)}, expected={EXPECTED_CITY_COUNT}")
-
-    key_df = pd.DataFrame({'DATE': df['DATE'].astype(str), 'CITY_STD': city_std.astype(str), 'FixedBase': fixed_base_series})
-    duplicated = key_df.duplicated(['DATE', 'CITY_STD', 'FixedBase'], keep=False)
-    if duplicated.any():
-        sample_text = ', '.join(f"{r.DATE}|{r.CITY_STD}|{r.FixedBase}" for r in key_df.loc[duplicated].head(max_details).itertuples(index=False))
-        issues.append(f"Duplicate primary keys: {sample_text}")
+    state = ValidationState()
+    with span('check', jobs=jobs, partitioned=batches is not None) as sp:
+        if batches is not None:
+            print(f'Partitions: {sum(len(b) for b in batches)}')
+            if jobs > 1:
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    for result in pool.map(check_files, batches):
+                        state.add(result)
+            else:
+                for batch in batches:
+                    state.add(check_files(batch))
+        else:
+            chunks = pd.read_csv(csv_path, dtype=str, chunksize=chunk_rows)
+            if jobs > 1:
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    for result in pool.map(check_chunk, chunks):
+                        state.add(result)
+            else:
+                for chunk in chunks:
+                    state.add(check_chunk(chunk))
+        sp.record(rows=state.rows)
+    print(f'Records: {state.rows}')
 
+    with span('report'):
+        issues, warnings = state.report(max_details)
     return print_report(issues, warnings)
 
 
@@ -110,9 +378,13 @@ def main() -> int:
     parser = argparse.ArgumentParser(description='70 City House Price Data Validation Tool')
     parser.add_argument('--csv', default=CSV_PATH, help='CSV file path')
     parser.add_argument('--max-details', type=int, default=8)
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Check partitions/chunks in parallel processes')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='Rows per chunk when reading a single CSV')
+    add_profile_args(parser)
     args = parser.parse_args()
+    configure_profiling(args, 'validata_price')
 
-    return validate_csv(args.csv, max_details=args.max_details)
+    return validate_csv(args.csv, max_details=args.max_details, jobs=max(1, args.jobs), chunk_rows=args.chunk_rows)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据工具 - 数据版本（vintage）
+
+每次 update_price 入库记为一个版本，保存在 data/70cityprice.vintages/：
+
+- index.json：各版本的编号、时间、来源、涉及月份、变化单元格数
+- vNNNN.delta.csv.gz：相对上一版本变化的单元格（DATE, CITY, FixedBase, COLUMN, VALUE），
+  整行删除记为 COLUMN = "*"
+- vNNNN.checkpoint.csv.gz：完整数据快照，首个版本（入库前的基础数据）及此后每 CHECKPOINT_INTERVAL 个版本一份
+
+读取任一版本 = 不晚于它的最近快照 + 依次应用其后的差量，最多应用 CHECKPOINT_INTERVAL - 1 个差量。
+统计局修订已发布月份时，被替换的旧值仍可按版本读出（extract_price --as-of）。
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+try:
+    import pandas as pd
+    HAS_DEPS = True
+except ImportError:
+    HAS_DEPS = False
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import CSV_PATH, OUTPUT_DIR, REQUIRED_COLUMNS
+if HAS_DEPS:
+    from data_store import date_to_month_key, write_json_atomic, convert_frame, sort_by_month
+    from partition_store import read_manifest, read_partitions, sorted_partitions, partition_name
+
+VINTAGE_VERSION = 1
+# 每隔多少个版本保存一份完整快照（按月发布约一年一份）
+CHECKPOINT_INTERVAL = 12
+KEY_COLUMNS = ['DATE', 'CITY', 'FixedBase']
+VALUE_COLUMNS = [c for c in REQUIRED_COLUMNS if c not in KEY_COLUMNS]
+DELTA_COLUMNS = KEY_COLUMNS + ['COLUMN', 'VALUE']
+DELETED = '*'
+
+# 进程内已重建的版本（版本写入后不再变化，按编号与创建时间复用）
+_LOADED = {}
+
+
+def vintage_dir_for(csv_path=CSV_PATH):
+    return os.path.splitext(os.path.abspath(csv_path))[0] + '.vintages'
+
+
+def index_path_for(csv_path=CSV_PATH):
+    return os.path.join(vintage_dir_for(csv_path), 'index.json')
+
+
+def read_index(csv_path=CSV_PATH):
+    try:
+        with open(index_path_for(csv_path), encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get('version') == VINTAGE_VERSION else None
+
+
+def _read_text_csv(path):
+    # 空值保留为空字符串，与“单元格被清空”的差量一致
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def _cells(df):
+    df = df.reindex(columns=REQUIRED_COLUMNS).fillna('').astype(str)
+    return df.drop_duplicates(KEY_COLUMNS, keep='last').set_index(KEY_COLUMNS)
+
+
+def diff_cells(old, new):
+    # 返回把 old 变为 new 所需的单元格差量（只比较 old/new 中出现的行）
+    old, new = _cells(old), _cells(new)
+    new_long = new.reset_index().melt(id_vars=KEY_COLUMNS, var_name='COLUMN', value_name='VALUE')
+    old_long = old.reset_index().melt(id_vars=KEY_COLUMNS, var_name='COLUMN', value_name='OLD')
+    merged = new_long.merge(old_long, on=KEY_COLUMNS + ['COLUMN'], how='left')
+    changed = merged[merged['VALUE'] != merged['OLD']][DELTA_COLUMNS]
+    removed = old.index.difference(new.index)
+    if len(removed):
+        deleted = removed.to_frame(index=False).assign(COLUMN=DELETED, VALUE='')
+        changed = pd.concat([changed, deleted], ignore_index=True)
+    return changed.reset_index(drop=True)
+
+
+def apply_delta(snapshot, delta):
+    # snapshot: 以 KEY_COLUMNS 为索引的文本宽表；原有行保持顺序，新增行追加在后
+    deleted = delta['COLUMN'] == DELETED
+    if deleted.any():
+        snapshot = snapshot.drop(index=pd.MultiIndex.from_frame(delta.loc[deleted, KEY_COLUMNS]), errors='ignore')
+    cells = delta[~deleted]
+    if cells.empty:
+        return snapshot
+    wide = cells.pivot(index=KEY_COLUMNS, columns='COLUMN', values='VALUE')
+    existing = wide.index.isin(snapshot.index)
+    if existing.any():
+        snapshot = snapshot.copy()
+        snapshot.update(wide[existing])
+    if not existing.all():
+        added = wide[~existing].reindex(columns=snapshot.columns).fillna('')
+        snapshot = pd.concat([snapshot, added])
+    return snapshot
+
+
+def canonical_order(df):
+    # 与分区存储一致：按月份，再按 CITY、FixedBase 排序
+    keys = df['DATE'].map({d: date_to_month_key(d) for d in df['DATE'].unique()})
+    return df.assign(_month=keys.to_numpy()).sort_values(['_month', 'CITY', 'FixedBase'], kind='stable') \
+        .drop(columns='_month').reset_index(drop=True)
+
+
+def _write_frame(path, df):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    df.to_csv(tmp_path, index=False, quoting=1, compression='gzip')
+    os.replace(tmp_path, path)
+
+
+def _write_checkpoint(csv_path, entry, snapshot):
+    file_name = f"v{entry['id']:04d}.checkpoint.csv.gz"
+    _write_frame(os.path.join(vintage_dir_for(csv_path), file_name), snapshot.fillna(''))
+    entry['checkpoint'] = file_name
+
+
+def ensure_base(csv_path=CSV_PATH, manifest=None):
+    # 首次记录版本前，把当前数据保存为版本 1（完整快照）
+    index = read_index(csv_path)
+    if index is not None:
+        return index
+    os.makedirs(vintage_dir_for(csv_path), exist_ok=True)
+    entry = {'id': 1, 'created': datetime.now().isoformat(timespec='seconds'), 'label': 'base',
+             'months': [], 'cells': 0}
+    index = {'version': VINTAGE_VERSION, 'checkpoint_interval': CHECKPOINT_INTERVAL, 'vintages': [entry]}
+    _write_checkpoint(csv_path, entry, read_partitions(csv_path, manifest=manifest))
+    write_json_atomic(index_path_for(csv_path), index)
+    return index
+
+
+def _same_as_last(csv_path, last, delta):
+    # 上次写入分区前中断时，重跑会得到与最后一个版本相同的差量，不重复记录
+    if not last.get('delta'):
+        return False
+    previous = _read_text_csv(os.path.join(vintage_dir_for(csv_path), last['delta']))
+    return previous.shape == delta.shape and (previous.astype(str).values == delta.astype(str).values).all()
+
+
+def record_vintage(csv_path, old_rows, new_rows, sources=None, manifest=None):
+    # 在替换分区之前调用：old_rows 为被替换月份的现有分区内容，new_rows 为即将写入的新月份内容
+    # （partition_store.partition_rows）。差量与索引先落盘，分区写入中断也不会丢失旧值
+    index = ensure_base(csv_path, manifest)
+    delta = diff_cells(old_rows, new_rows)
+    if delta.empty:
+        return None
+    last = index['vintages'][-1]
+    if _same_as_last(csv_path, last, delta):
+        return None
+    entry = {'id': last['id'] + 1, 'created': datetime.now().isoformat(timespec='seconds'),
+             'label': ', '.join(sorted(set((sources or {}).values()))) or 'update',
+             'months': sorted(delta['DATE'].unique().tolist(), key=date_to_month_key),
+             'cells': int((delta['COLUMN'] != DELETED).sum()),
+             'delta': f"v{last['id'] + 1:04d}.delta.csv.gz"}
+    _write_frame(os.path.join(vintage_dir_for(csv_path), entry['delta']), delta)
+    if (entry['id'] - 1) % index.get('checkpoint_interval', CHECKPOINT_INTERVAL) == 0:
+        # 快照为写入后的完整数据：未变化的分区 + 新月份
+        months = {partition_name(date_to_month_key(d)) for d in new_rows['DATE'].dropna().unique()}
+        manifest = manifest or read_manifest(csv_path)
+        kept = read_partitions(csv_path, names=[n for n in sorted_partitions(manifest) if n not in months],
+                               manifest=manifest)
+        _write_checkpoint(csv_path, entry, canonical_order(pd.concat([kept, new_rows], ignore_index=True)))
+    index['vintages'].append(entry)
+    write_json_atomic(index_path_for(csv_path), index)
+    return entry
+
+
+def resolve_vintage(index, spec):
+    # spec 为版本编号，或日期 YYYY-MM-DD / YYYYMMDD（取当天结束前的最后一个版本）
+    text = str(spec).strip()
+    ids = [v['id'] for v in index['vintages']]
+    if text.isdigit() and len(text) < 8:
+        if int(text) not in ids:
+            raise ValueError(f"Unknown vintage: {text} (available: {ids[0]}-{ids[-1]})")
+        return int(text)
+    try:
+        day = datetime.strptime(text.replace('-', ''), '%Y%m%d').date().isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid vintage: {spec} (use a vintage number or YYYY-MM-DD)")
+    earlier = [v['id'] for v in index['vintages'] if v['created'][:10] <= day]
+    if not earlier:
+        raise ValueError(f"No vintage on or before {day}")
+    return earlier[-1]
+
+
+def load_vintage(csv_path=CSV_PATH, spec=None):
+    # 返回该版本的原始文本表（与 read_raw_csv 的结果同形），空值为 NaN
+    index = read_index(csv_path)
+    if index is None:
+        raise ValueError(f"No vintages recorded for {csv_path}")
+    vintage_id = index['vintages'][-1]['id'] if spec is None else resolve_vintage(index, spec)
+    entries = {v['id']: v for v in index['vintages']}
+    memo_key = (os.path.abspath(csv_path), vintage_id, entries[vintage_id]['created'])
+    if memo_key in _LOADED:
+        return _LOADED[memo_key]
+
+    vintage_dir = vintage_dir_for(csv_path)
+    base = max(i for i, v in entries.items() if i <= vintage_id and v.get('checkpoint'))
+    snapshot = _cells(_read_text_csv(os.path.join(vintage_dir, entries[base]['checkpoint'])))
+    for i in range(base + 1, vintage_id + 1):
+        if i in entries:
+            snapshot = apply_delta(snapshot, _read_text_csv(os.path.join(vintage_dir, entries[i]['delta'])))
+    df = canonical_order(snapshot.reset_index()[REQUIRED_COLUMNS])
+    df = df.mask(df == '')
+    _LOADED[memo_key] = df
+    return df
+
+
+def load_vintage_frame(csv_path=CSV_PATH, spec=None):
+    # 与 data_store.read_typed 相同的定型表
+    return sort_by_month(convert_frame(load_vintage(csv_path, spec)))
+
+
+def print_vintages(index):
+    print(f"\n{'ID':>4}  {'Created':<20}{'Cells':>8}  {'Months':<24}Source")
+    for v in index['vintages']:
+        months = v['months']
+        span = '-' if not months else months[0] if len(months) == 1 else f"{months[0]} .. {months[-1]}"
+        flag = ' [checkpoint]' if v.get('checkpoint') else ''
+        print(f"{v['id']:>4}  {v['created'].replace('T', ' '):<20}{v['cells']:>8}  {span:<24}{v['label']}{flag}")
+
+
+def main():
+    if not HAS_DEPS:
+        print("ERROR: Missing pandas dependency")
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description='70 City House Price Data Vintages')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('list', help='List recorded vintages')
+    changes_parser = subparsers.add_parser('changes', help='Cells changed by one vintage')
+    changes_parser.add_argument('vintage', help='Vintage number or date (YYYY-MM-DD)')
+    changes_parser.add_argument('--output', '-o', help='Write all changed cells to CSV')
+    export_parser = subparsers.add_parser('export', help='Export the full data as of a vintage')
+    export_parser.add_argument('vintage', help='Vintage number or date (YYYY-MM-DD)')
+    export_parser.add_argument('--output', '-o', required=True, help='Output CSV path')
+    args = parser.parse_args()
+
+    if args.command is None:
+        parser.print_help()
+        return 0
+    index = read_index(CSV_PATH)
+    if index is None:
+        print("No vintages recorded yet (they are created by update_price)")
+        return 0 if args.command == 'list' else 1
+
+    try:
+        if args.command == 'list':
+            print_vintages(index)
+        elif args.command == 'changes':
+            entry = {v['id']: v for v in index['vintages']}[resolve_vintage(index, args.vintage)]
+            if not entry.get('delta'):
+                print(f"Vintage {entry['id']} is the base snapshot")
+                return 0
+            delta = _read_text_csv(os.path.join(vintage_dir_for(CSV_PATH), entry['delta']))
+            print(f"Vintage {entry['id']} ({entry['label']}): {entry['cells']} changed cells")
+            print(delta.head(20).to_string(index=False))
+            if args.output:
+                path = args.output if os.path.dirname(args.output) else os.path.join(OUTPUT_DIR, args.output)
+                delta.to_csv(path, index=False, quoting=1)
+                print(f"[OK] Saved to: {path}")
+        else:
+            df = load_vintage(CSV_PATH, args.vintage)
+            df.to_csv(args.output, index=False, quoting=1)
+            print(f"[DONE] Exported {len(df)} records to: {args.output}")
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
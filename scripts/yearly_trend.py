@@ -7,6 +7,11 @@ import sys
 import os
 import argparse
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from daemon_client import forward_to_daemon
+if __name__ == '__main__':
+    forward_to_daemon('yearly_trend')
+
 try:
     import pandas as pd
     import matplotlib.pyplot as plt
@@ -15,52 +20,25 @@ try:
 except ImportError:
     HAS_DEPS = False
 
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from config import CSV_PATH, OUTPUT_DIR, normalize_city_name, CITY_ADCODE
+from profiling import span, add_profile_args, configure as configure_profiling
+if HAS_DEPS:
+    from aggregates import load_aggregates, period_label, STATS
+    from render_cache import RenderCache
 
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Heiti SC', 'Microsoft YaHei', 'Arial Unicode MS']
 plt.rcParams['axes.unicode_minus'] = False
 
 
-def load_data():
-    if not os.path.exists(CSV_PATH):
-        print(f"ERROR: CSV file not found: {CSV_PATH}")
-        sys.exit(1)
-    print(f"Reading data file: {CSV_PATH}")
-    df = pd.read_csv(CSV_PATH, dtype=str)
-    print(f"Total records: {len(df)}")
-    return df
+def calculate_yearly_avg(cities, start_year, end_year, fixedbase, period='year', stat='mean', csv_path=CSV_PATH):
+    # 直接读取预先计算的年度/季度汇总表
+    aggregates = load_aggregates(csv_path)
+    start, end = (start_year, end_year) if period == 'year' else (start_year * 4, end_year * 4 + 3)
+    frame = aggregates.frame(cities, fixedbase, 'CommodityHouseIDX', period, stat, start, end)
+    return {city: frame[city].dropna() for city in cities}
 
 
-def filter_data(df, cities, start_year, end_year, fixedbase):
-    city_norms = {normalize_city_name(c) for c in cities}
-    df = df[df['CITY'].apply(lambda x: normalize_city_name(x) in city_norms)]
-    
-    if fixedbase:
-        df = df[df['FixedBase'] == fixedbase]
-    
-    df['DATE'] = pd.to_datetime(df['DATE'], format='%Y/%m/%d', errors='coerce')
-    df = df.dropna(subset=['DATE'])
-    df['YEAR'] = df['DATE'].dt.year
-    
-    df = df[(df['YEAR'] >= start_year) & (df['YEAR'] <= end_year)]
-    
-    return df
-
-
-def calculate_yearly_avg(df, cities):
-    df['CommodityHouseIDX'] = pd.to_numeric(df['CommodityHouseIDX'], errors='coerce')
-    
-    yearly_data = {}
-    for city in cities:
-        city_data = df[df['CITY'] == city]
-        yearly_avg = city_data.groupby('YEAR')['CommodityHouseIDX'].mean()
-        yearly_data[city] = yearly_avg
-    
-    return yearly_data
-
-
-def create_yearly_trend_chart(yearly_data, cities, output_path, fixedbase):
+def create_yearly_trend_chart(yearly_data, cities, output_path, fixedbase, period='year'):
     fig, ax = plt.subplots(figsize=(14, 8), dpi=150)
     
     colors = {'北京': '#E53935', '上海': '#1E88E5', '广州': '#43A047', '深圳': '#FB8C00'}
@@ -93,7 +71,7 @@ def create_yearly_trend_chart(yearly_data, cities, output_path, fixedbase):
     ax.set_ylabel(f'Price Index ({fixedbase})', fontsize=12)
     
     ax.set_xticks(all_years)
-    ax.set_xticklabels([str(y) for y in all_years], rotation=45, ha='right')
+    ax.set_xticklabels([period_label(y, period) for y in all_years], rotation=45, ha='right')
     
     ax.legend(loc='upper right', fontsize=11, framealpha=0.9)
     ax.grid(True, alpha=0.3)
@@ -121,8 +99,13 @@ def main():
     parser.add_argument('--width', type=float, default=14)
     parser.add_argument('--height', type=float, default=8)
     parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--period', choices=['year', 'quarter'], default='year', help='Aggregate by year or quarter')
+    parser.add_argument('--stat', choices=STATS, default='mean', help='Aggregate of the monthly values')
+    parser.add_argument('--force', action='store_true', help='Re-render even if an identical chart is cached')
+    add_profile_args(parser)
     
     args = parser.parse_args()
+    configure_profiling(args, 'yearly_trend')
     
     if not os.path.exists(CSV_PATH):
         print(f"ERROR: CSV file not found")
@@ -143,30 +126,42 @@ def main():
     plt.rcParams['figure.figsize'] = (args.width, args.height)
     plt.rcParams['figure.dpi'] = args.dpi
     
-    df = load_data()
-    df_filtered = filter_data(df, cities, args.start, args.end, args.fixedbase)
-    print(f"Filtered records: {len(df_filtered)}")
+    with span('aggregate', period=args.period, stat=args.stat) as sp:
+        yearly_data = calculate_yearly_avg(cities, args.start, args.end, args.fixedbase, args.period, args.stat)
+        sp.record(rows=sum(len(v) for v in yearly_data.values()))
+    print(f"Periods with data: {sum(len(v) for v in yearly_data.values())}")
     
-    if len(df_filtered) == 0:
+    if all(len(v) == 0 for v in yearly_data.values()):
         print("ERROR: No data found matching criteria")
         sys.exit(1)
     
-    yearly_data = calculate_yearly_avg(df_filtered, cities)
-    
-    print("\n=== Annual Average Price Index ===")
+    title = 'Annual Average' if (args.period, args.stat) == ('year', 'mean') else f'{args.period.title()} {args.stat}'
+    print(f"\n=== {title} Price Index ===")
     for city in cities:
         print(f"\n{city}:")
         for year in sorted(yearly_data[city].index):
-            print(f"  {year}: {yearly_data[city][year]:.1f}")
+            print(f"  {period_label(year, args.period)}: {yearly_data[city][year]:.1f}")
     
     if args.output:
         output_path = args.output
     else:
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         cities_str = '_'.join(cities[:2]) + ('_etc' if len(cities) > 2 else '')
-        output_path = os.path.join(OUTPUT_DIR, f"yearly_trend_{cities_str}_{args.fixedbase}.png")
-    
-    create_yearly_trend_chart(yearly_data, cities, output_path, args.fixedbase)
+        suffix = '' if (args.period, args.stat) == ('year', 'mean') else f"_{args.period}_{args.stat}"
+        output_path = os.path.join(OUTPUT_DIR, f"yearly_trend_{cities_str}_{args.fixedbase}{suffix}.png")
+    
+    cache = RenderCache(reuse=not args.force)
+    yearly_frame = pd.DataFrame({city: yearly_data[city] for city in cities}).rename_axis('YEAR').reset_index()
+    fp = cache.fingerprint(yearly_frame, {'cities': cities, 'fixedbase': args.fixedbase, 'period': args.period,
+                                          'format': os.path.splitext(output_path)[1].lower()}, __file__)
+    with span('render_chart', cities=len(cities)) as sp:
+        cached = cache.fetch(fp, output_path)
+        if not cached:
+            create_yearly_trend_chart(yearly_data, cities, output_path, args.fixedbase, args.period)
+            cache.store(fp, output_path)
+        sp.record(cached=cached)
+    if cached:
+        print(f"Chart unchanged, reused cached render: {output_path}")
     
     print(f"\n[DONE] Chart generated successfully!")
 
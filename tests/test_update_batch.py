@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+update_price 批量模式测试：本地 http.server 提供保存的发布页（fixtures/releases/），
+在临时数据目录（CITYPRICE_DATA_DIR）中以 2025 年 12 月的数据为基础运行命令行。
+
+    python -m pytest tests        # 或 python -m unittest discover tests
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import subprocess
+import unittest
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(TESTS_DIR, 'fixtures')
+UPDATE_SCRIPT = os.path.join(TESTS_DIR, '..', 'scripts', 'update_price.py')
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class BatchUpdateTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        handler = partial(_QuietHandler, directory=os.path.join(FIXTURES_DIR, 'releases'))
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix='cityprice-test-')
+        shutil.copy(os.path.join(FIXTURES_DIR, '70cityprice_202512.csv'),
+                    os.path.join(self.data_dir, '70cityprice.csv'))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def run_batch(self, pages):
+        urls = [f'{self.base_url}/{page}' for page in pages]
+        url_file = os.path.join(self.data_dir, 'urls.txt')
+        with open(url_file, 'w', encoding='utf-8') as f:
+            f.write('# 测试批次\n' + '\n'.join(urls) + '\n')
+        env = dict(os.environ, CITYPRICE_DATA_DIR=self.data_dir, CITYPRICE_NO_DAEMON='1')
+        env.pop('CITYPRICE_CACHE_DIR', None)
+        proc = subprocess.run([sys.executable, UPDATE_SCRIPT, '--batch', url_file, '--workers', '2',
+                               '--retries', '0', '--no-cache'],
+                              capture_output=True, text=True, encoding='utf-8', env=env, timeout=300)
+        return proc, urls
+
+    def manifest(self):
+        with open(os.path.join(self.data_dir, '70cityprice.parts', 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_all_pages_ingested(self):
+        proc, urls = self.run_batch(['t20260215_1.html', 't20260315_1.html'])
+        self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+        self.assertIn(f'[OK] {urls[0]} - 2026/1/1: 210 records', proc.stdout)
+        self.assertIn(f'[OK] {urls[1]} - 2026/2/1: 210 records', proc.stdout)
+        self.assertIn('Succeeded: 2, Failed: 0', proc.stdout)
+
+        partitions = self.manifest()['partitions']
+        self.assertEqual(sorted(partitions), ['202512', '202601', '202602'])
+        self.assertEqual(partitions['202601']['source_url'], urls[0])
+        self.assertEqual(partitions['202602']['source_url'], urls[1])
+        self.assertEqual([partitions[n]['rows'] for n in ('202512', '202601', '202602')], [210, 210, 210])
+        with open(os.path.join(self.data_dir, '70cityprice.parts', '202602.csv'), encoding='utf-8') as f:
+            rows = f.read().splitlines()
+        self.assertEqual(len(rows), 211)
+        self.assertTrue(all(r.startswith('"2026/2/1",') for r in rows[1:]))
+
+    def test_missing_page_fails_batch(self):
+        proc, urls = self.run_batch(['t20260215_1.html', 't20260415_1.html', 't20260315_1.html'])
+        self.assertEqual(proc.returncode, 1, proc.stdout + proc.stderr)
+        self.assertIn(f'[FAIL] {urls[1]} - fetch failed', proc.stdout)
+        self.assertIn('404', proc.stdout)
+        self.assertIn(f'[OK] {urls[0]}', proc.stdout)
+        self.assertIn(f'[OK] {urls[2]}', proc.stdout)
+        self.assertIn('Succeeded: 2, Failed: 1', proc.stdout)
+        self.assertNotIn('[DONE]', proc.stdout)
+        # 失败的URL不影响其他月份写入
+        self.assertEqual(sorted(self.manifest()['partitions']), ['202512', '202601', '202602'])
+
+
+if __name__ == '__main__':
+    unittest.main()